@@ -66,14 +66,25 @@ if model_manager is None:
 # Utilities
 # =========================
 
+# Precompiled patterns used on every upload/search
+_SPACES_RE = re.compile(r"[ \t]+")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+_PAGE_MARKER_RE = re.compile(r"^\[\[PAGE:(\d+)\|PARA:(\d+)\]\]\s*(.*)$", re.DOTALL)
+_DATE_RE = re.compile(r"(\d{1,2}\s+[A-Za-z]+\s+\d{4})")
+_PAGE_COUNT_QUERY_RE = re.compile(r"total pages|number of pages|how many pages|page count")
+_COUNT_QUERY_RE = re.compile(r"how many|total|number of|count")
+_PAGE_WORD_RE = re.compile(r"total|page")
+_DIGIT_RE = re.compile(r"\d")
+_EMPTY_ANSWERS = frozenset({"[1]", "[2]", "[3]", "", "Answer in one clear sentence."})
+
 def clean_text(text: str) -> str:
-    text = re.sub(r"[ \t]+", " ", text)
-    text = re.sub(r"\n{3,}", "\n\n", text)
+    text = _SPACES_RE.sub(" ", text)
+    text = _BLANK_LINES_RE.sub("\n\n", text)
     return text.strip()
 
 
 def _detect_page_marker(text: str) -> tuple[Optional[int], Optional[int], str]:
-    match = re.match(r"^\[\[PAGE:(\d+)\|PARA:(\d+)\]\]\s*(.*)$", text or "", re.DOTALL)
+    match = _PAGE_MARKER_RE.match(text or "")
     if not match:
         return None, None, text
     page_number = int(match.group(1))
@@ -370,13 +381,13 @@ def generate_summary(text: str) -> str:
 # Answer synthesis
 # =========================
 def extract_date_from_context(context_text: str):
-    match = re.search(r"(\d{1,2}\s+[A-Za-z]+\s+\d{4})", context_text)
+    match = _DATE_RE.search(context_text)
     if match:
         return match.group(1)
     return None
 
 def clean_answer(query: str, answer: str) -> str:
-    if not answer or answer.strip() in ["[1]", "[2]", "[3]", "", "Answer in one clear sentence."]:
+    if not answer or answer.strip() in _EMPTY_ANSWERS:
         return "I could not find the answer in the document."
     
     # Detect potential hallucinations for factual questions
@@ -384,15 +395,16 @@ def clean_answer(query: str, answer: str) -> str:
     answer_lower = answer.lower()
     
     # Check for page count hallucinations
-    if any(phrase in query_lower for phrase in ["total pages", "number of pages", "how many pages", "page count"]):
-        if any(phrase in answer_lower for phrase in ["total", "pages", "page"]) and any(char.isdigit() for char in answer):
+    has_digits = _DIGIT_RE.search(answer) is not None
+    if _PAGE_COUNT_QUERY_RE.search(query_lower):
+        if has_digits and _PAGE_WORD_RE.search(answer_lower):
             logger.warning(f"Potential page count hallucination detected: {answer}")
             return "I cannot determine the total number of pages from the document content. This information would need to be extracted from document metadata."
     
     # Only check for numeric hallucinations on very short answers (removed the restrictive check)
-    if any(phrase in query_lower for phrase in ["how many", "total", "number of", "count"]):
+    if _COUNT_QUERY_RE.search(query_lower):
         # Only flag if answer is extremely short AND contains numbers
-        if any(char.isdigit() for char in answer) and len(answer.strip().split()) < 5:  # Much more lenient
+        if has_digits and len(answer.split()) < 5:  # Much more lenient
             logger.warning(f"Potential numeric hallucination detected for query '{query}': {answer}")
             return "I could not find specific numerical information to answer this question accurately in the provided context."
     
@@ -428,25 +440,27 @@ def synthesize_answer(
         "Always stay grounded in the provided context and cite page numbers when available."
     )
 
+    query_lower = query.lower()
+
     # Handle summaries
-    if answer_mode == "summary" or "summary" in query.lower():
+    if answer_mode == "summary" or "summary" in query_lower:
         full_text = " ".join(c['text'] for c in contexts)
         return generate_summary(full_text)
 
     # Handle exam dates
-    if "exam" in query.lower():
+    if "exam" in query_lower:
         extracted = extract_date_from_context(context_text)
         if extracted:
             return f"The Preliminary Examination is scheduled for {extracted}."
 
     # Handle last date
-    if "last date" in query.lower():
+    if "last date" in query_lower:
         extracted = extract_date_from_context(context_text)
         if extracted:
             return f"The last date is {extracted}."
     
     # Handle page count questions - these require document metadata, not text content
-    if any(phrase in query.lower() for phrase in ["total pages", "number of pages", "how many pages", "page count"]):
+    if _PAGE_COUNT_QUERY_RE.search(query_lower):
         logger.warning(f"Page count question detected: {query}")
         return "I cannot determine the total number of pages from the document content. Page count information would need to be extracted from document metadata during upload."
 
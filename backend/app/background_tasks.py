@@ -1,8 +1,9 @@
 import uuid
-from typing import Dict, Any
+from typing import Dict, Any, List
 from sqlalchemy.orm import Session
 import os
 import time
+import threading
 import shutil
 
 from . import crud, db
@@ -27,8 +28,14 @@ def get_ai_utils():
             pass
     return ai_utils
 
-# In-memory storage for task status (in production, use Redis or a DB table)
-task_status: Dict[str, Dict[str, Any]] = {}
+# In-memory storage for task status (in production, use Redis or a DB table).
+# Sharded by task id so concurrent uploads only contend on their own shard's lock.
+_TASK_SHARDS = 16
+_task_status_shards: List[Dict[str, Dict[str, Any]]] = [{} for _ in range(_TASK_SHARDS)]
+_task_status_locks: List[threading.Lock] = [threading.Lock() for _ in range(_TASK_SHARDS)]
+
+def _task_shard(task_id: str) -> int:
+    return hash(task_id) & (_TASK_SHARDS - 1)
 
 def generate_task_id() -> str:
     """Generate unique task ID"""
@@ -42,18 +49,26 @@ def update_task_status(
     result: Any = None
 ):
     """Update task status"""
-    task_status[task_id] = {
+    entry = {
         "status": status,      # "processing", "completed", "failed"
         "progress": progress,  # 0-100
         "message": message,
         "result": result,
         "updated_at": time.time()
     }
+    shard = _task_shard(task_id)
+    with _task_status_locks[shard]:
+        _task_status_shards[shard][task_id] = entry
     logger.info(f"Task {task_id}: {status} - {message} ({progress}%)")
 
 def get_task_status(task_id: str) -> Dict[str, Any]:
-    """Get task status"""
-    return task_status.get(task_id, {"status": "not_found", "message": "Task not found"})
+    """Get a snapshot of the task status (safe to read while the task keeps running)"""
+    shard = _task_shard(task_id)
+    with _task_status_locks[shard]:
+        entry = _task_status_shards[shard].get(task_id)
+        if entry is None:
+            return {"status": "not_found", "message": "Task not found"}
+        return dict(entry)
 
 def process_document_async(
     file_content: bytes,
@@ -185,13 +200,16 @@ def cleanup_old_tasks(max_age_hours: int = 24):
     current_time = time.time()
     cutoff_time = current_time - (max_age_hours * 3600)
 
-    old_tasks = [
-        task_id for task_id, status in list(task_status.items())
-        if status.get("updated_at", 0) < cutoff_time
-    ]
-
-    for task_id in old_tasks:
-        del task_status[task_id]
-
-    if old_tasks:
-        logger.info(f"Cleaned up {len(old_tasks)} old tasks")
+    removed = 0
+    for shard, lock in zip(_task_status_shards, _task_status_locks):
+        with lock:
+            old_tasks = [
+                task_id for task_id, status in shard.items()
+                if status.get("updated_at", 0) < cutoff_time
+            ]
+            for task_id in old_tasks:
+                del shard[task_id]
+        removed += len(old_tasks)
+
+    if removed:
+        logger.info(f"Cleaned up {removed} old tasks")
@@ -1,11 +1,70 @@
 import hashlib
 import json
+import sqlite3
 import time
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Sequence
 from functools import lru_cache
 import threading
+from collections import OrderedDict
+import numpy as np
 from .logger import logger
 
+class PersistentEmbeddingCache:
+    """SQLite-backed embedding store (blake2b digest -> float16 blob) shared across processes and restarts"""
+
+    _MAX_SQL_PARAMS = 500  # stay well below SQLITE_MAX_VARIABLE_NUMBER on old builds
+
+    def __init__(self, path: str, namespace: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS emb (k BLOB PRIMARY KEY, v BLOB)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+
+        # Vectors from a different embedding model are not comparable; start over when it changes
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'namespace'").fetchone()
+        if row is None or row[0] != namespace:
+            with self._lock:
+                self._conn.execute("BEGIN")
+                self._conn.execute("DELETE FROM emb")
+                self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('namespace', ?)", (namespace,))
+                self._conn.execute("COMMIT")
+        # Row count kept in memory so stats never scan the table; counted once here, then
+        # bumped by put_many (approximate: replaced keys and other processes' writes aren't tracked)
+        self._approx_rows = self._conn.execute("SELECT COUNT(*) FROM emb").fetchone()[0]
+
+    def get_many(self, keys: Sequence[bytes]) -> Dict[bytes, np.ndarray]:
+        """Fetch stored embeddings for the given digests as float32 arrays"""
+        found: Dict[bytes, np.ndarray] = {}
+        with self._lock:
+            for start in range(0, len(keys), self._MAX_SQL_PARAMS):
+                part = keys[start:start + self._MAX_SQL_PARAMS]
+                placeholders = ",".join("?" * len(part))
+                for k, v in self._conn.execute(f"SELECT k, v FROM emb WHERE k IN ({placeholders})", part):
+                    found[bytes(k)] = np.frombuffer(v, dtype=np.float16).astype(np.float32)
+        return found
+
+    def put_many(self, items: Sequence[tuple]):
+        """Store (digest, embedding) pairs in a single transaction"""
+        rows = [(k, np.asarray(v, dtype=np.float16).tobytes()) for k, v in items]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("INSERT OR REPLACE INTO emb VALUES (?, ?)", rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._approx_rows += len(rows)
+
+    def size(self) -> int:
+        """Approximate number of stored embeddings"""
+        return self._approx_rows
+
+
 class CacheManager:
     """Smart caching system for embeddings and search results"""
     
@@ -15,6 +74,11 @@ class CacheManager:
         self._cache_lock = threading.RLock()
         self._max_cache_size = 1000  # Maximum cached items
         self._cache_ttl = 3600  # 1 hour TTL
+        # Query embeddings: bounded LRU keyed by normalized query text
+        self._query_embedding_cache: "OrderedDict[bytes, List[float]]" = OrderedDict()
+        self._max_query_cache_size = 4096
+        # Optional on-disk layer behind the in-memory embedding cache
+        self._persistent_embeddings: Optional[PersistentEmbeddingCache] = None
         
         logger.info("CacheManager initialized")
     
@@ -47,29 +111,40 @@ class CacheManager:
                 key = sorted_items[i][0]
                 del cache_dict[key]
     
-    def get_embedding(self, text: str) -> Optional[List[float]]:
-        """Get cached embedding if available"""
-        cache_key = self._generate_cache_key(text)
+    @staticmethod
+    def embedding_key(text: str) -> bytes:
+        """Digest used to key the embedding cache; compute once per text and pass it along"""
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+    def get_embedding_array(self, text: str, key: Optional[bytes] = None) -> Optional[np.ndarray]:
+        """Get cached embedding as a read-only float32 array if available"""
+        cache_key = key if key is not None else self.embedding_key(text)
         
         with self._cache_lock:
-            if cache_key in self._embedding_cache:
-                entry = self._embedding_cache[cache_key]
+            entry = self._embedding_cache.get(cache_key)
+            if entry is not None:
                 if self._is_cache_valid(entry['timestamp']):
-                    logger.debug(f"Cache hit for embedding: {cache_key}")
-                    return entry['embedding']
+                    logger.debug(f"Cache hit for embedding: {cache_key.hex()}")
+                    return np.frombuffer(entry['embedding'], dtype=np.float32)
                 else:
                     # Remove expired entry
                     del self._embedding_cache[cache_key]
         
         return None
+
+    def get_embedding(self, text: str, key: Optional[bytes] = None) -> Optional[List[float]]:
+        """Get cached embedding if available"""
+        embedding = self.get_embedding_array(text, key)
+        return embedding.tolist() if embedding is not None else None
     
-    def cache_embedding(self, text: str, embedding: List[float]):
-        """Cache an embedding"""
-        cache_key = self._generate_cache_key(text)
+    def cache_embedding(self, text: str, embedding: Any, key: Optional[bytes] = None):
+        """Cache an embedding (list or ndarray), stored as packed float32 bytes"""
+        cache_key = key if key is not None else self.embedding_key(text)
+        packed = np.asarray(embedding, dtype=np.float32).tobytes()
         
         with self._cache_lock:
             self._embedding_cache[cache_key] = {
-                'embedding': embedding,
+                'embedding': packed,
                 'timestamp': time.time()
             }
             
@@ -77,8 +152,75 @@ class CacheManager:
             if len(self._embedding_cache) > self._max_cache_size * 1.2:
                 self._cleanup_old_entries(self._embedding_cache)
         
-        logger.debug(f"Cached embedding: {cache_key}")
+        logger.debug(f"Cached embedding: {cache_key.hex()}")
     
+    def enable_persistent_embeddings(self, path: str, namespace: str):
+        """Back the embedding cache with a SQLite file; namespace identifies the embedding model"""
+        try:
+            self._persistent_embeddings = PersistentEmbeddingCache(path, namespace)
+            logger.info(f"Persistent embedding cache enabled at {path}")
+        except Exception as e:
+            logger.warning(f"Persistent embedding cache unavailable ({path}): {e}")
+            self._persistent_embeddings = None
+
+    def get_embedding_arrays(self, texts: Sequence[str], keys: Sequence[bytes]) -> List[Optional[np.ndarray]]:
+        """Look up many embeddings: memory first, then one batched query against the on-disk cache"""
+        found = [self.get_embedding_array(text, key) for text, key in zip(texts, keys)]
+        missing = [i for i, emb in enumerate(found) if emb is None]
+        if missing and self._persistent_embeddings is not None:
+            try:
+                stored = self._persistent_embeddings.get_many([keys[i] for i in missing])
+            except Exception as e:
+                logger.warning(f"Persistent embedding lookup failed: {e}")
+                stored = {}
+            for i in missing:
+                embedding = stored.get(keys[i])
+                if embedding is not None:
+                    self.cache_embedding(texts[i], embedding, keys[i])
+                    found[i] = embedding
+        return found
+
+    def cache_embeddings(self, texts: Sequence[str], keys: Sequence[bytes], embeddings: Sequence[Any]):
+        """Cache many embeddings in memory and write them through to the on-disk cache"""
+        for text, key, embedding in zip(texts, keys, embeddings):
+            self.cache_embedding(text, embedding, key)
+        if self._persistent_embeddings is not None:
+            try:
+                self._persistent_embeddings.put_many(list(zip(keys, embeddings)))
+            except Exception as e:
+                logger.warning(f"Persistent embedding write failed: {e}")
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Collapse case and whitespace so trivially different queries share a cache entry"""
+        return " ".join(query.lower().split())
+
+    def _query_cache_key(self, query: str) -> bytes:
+        return hashlib.blake2b(self.normalize_query(query).encode('utf-8'), digest_size=16).digest()
+
+    def get_query_embedding(self, query: str) -> Optional[List[float]]:
+        """Get cached query embedding if available (LRU, no TTL)"""
+        cache_key = self._query_cache_key(query)
+
+        with self._cache_lock:
+            embedding = self._query_embedding_cache.get(cache_key)
+            if embedding is not None:
+                self._query_embedding_cache.move_to_end(cache_key)
+        return embedding
+
+    def cache_query_embedding(self, query: str, embedding: List[float]):
+        """Cache a query embedding, evicting the least recently used entry when full"""
+        # Never pin the all-zero fallback vector returned when the embedder fails
+        if not any(embedding):
+            return
+        cache_key = self._query_cache_key(query)
+
+        with self._cache_lock:
+            self._query_embedding_cache[cache_key] = embedding
+            self._query_embedding_cache.move_to_end(cache_key)
+            if len(self._query_embedding_cache) > self._max_query_cache_size:
+                self._query_embedding_cache.popitem(last=False)
+
     def get_search_results(self, query: str, doc_id: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
         """Get cached search results if available"""
         search_key = f"{query}_{doc_id or 'all'}"
@@ -117,14 +259,18 @@ class CacheManager:
         with self._cache_lock:
             self._embedding_cache.clear()
             self._search_cache.clear()
+            self._query_embedding_cache.clear()
         logger.info("All caches cleared")
     
     def get_cache_stats(self) -> Dict[str, Any]:
         """Get cache statistics"""
+        persistent = self._persistent_embeddings
         with self._cache_lock:
             return {
                 'embedding_cache_size': len(self._embedding_cache),
                 'search_cache_size': len(self._search_cache),
+                'query_embedding_cache_size': len(self._query_embedding_cache),
+                'persistent_embedding_cache_size': persistent.size() if persistent is not None else 0,
                 'max_cache_size': self._max_cache_size,
                 'cache_ttl': self._cache_ttl
             }
@@ -6,18 +6,26 @@ class Settings(BaseSettings):
     # Database
     database_url: str = "sqlite:///./ai_docs.db"
     postgres_url: Optional[str] = None
+    use_pgvector: bool = False  # On PostgreSQL, store chunk embeddings as pgvector and rank in-database (new tables)
+    packed_embeddings: bool = False  # Store chunk embeddings as packed float32 bytes instead of JSON (new tables)
     
     # File processing - OPTIMIZED FOR QUALITY
     chunk_size: int = 1200  # Larger chunks = more context for better answers
     chunk_overlap: int = 200  # More overlap = better context continuity
     max_file_size: int = 25 * 1024 * 1024  # 10MB
     upload_dir: str = "uploads"
+    embedding_store_dir: str = "embeddings"  # Per-document <doc_id>.npy matrices memory-mapped at search time
     
     # AI Models - SAFE AND COMPATIBLE VERSIONS
     embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2"  # Better embeddings
+    embedding_dim: int = 384  # Output size of embedding_model; fixes the pgvector column width
     summarization_model: str = "facebook/bart-large-cnn"
     reranker_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
     text_generation_model: str = "google/flan-t5-base"  
+    embedding_int8_cpu: bool = True  # Use an int8 ONNX embedder on CPU when optimum is installed
+    # Torch intra-op threads on CPU (env INTELLIDOC_TORCH_THREADS); one per physical core, assuming 2-way SMT
+    intellidoc_torch_threads: int = max(1, (os.cpu_count() or 2) // 2)
+    embedding_torch_compile: bool = False  # torch.compile the embedder forward on CUDA (compiles warm up at preload)
     
     # Search - OPTIMIZED FOR COMPREHENSIVE ANSWERS
     default_search_limit: int = 10
@@ -27,6 +35,7 @@ class Settings(BaseSettings):
     
     # Upload processing - OPTIMIZED FOR SPEED
     embedding_batch_size: int = 128  # Larger batches = faster GPU throughput
+    embedding_cache_path: Optional[str] = "embedding_cache.db"  # On-disk embedding cache; empty to disable
     db_batch_insert_size: int = 500  # Batch DB inserts for speed
     
     # CORS
@@ -38,6 +47,7 @@ class Settings(BaseSettings):
     
     # Security
     allowed_extensions: set = {".pdf", ".docx", ".txt", ".doc"}
+    deep_magic: bool = False  # Consult libmagic when the header-byte sniff finds no known signature
     
     # Hugging Face
     hf_token: Optional[str] = None
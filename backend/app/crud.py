@@ -1,18 +1,18 @@
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, desc
+from sqlalchemy.orm import Session, joinedload, defer
+from sqlalchemy import func, desc, Float
 from . import models
 from .logger import logger
 import numpy as np
 import re
-from typing import List, Optional, Dict, Any
-from sqlalchemy.orm import Session
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Dict, Any, NamedTuple
 from datetime import datetime, timedelta
 import hashlib
 import os
 import binascii
 import secrets
-from . import models
-from .logger import logger
+from .config import settings
 
 # ------------------ Create document ------------------
 def create_document(db: Session, title: str, content: str, summary: str, chunks: list):
@@ -29,6 +29,9 @@ def create_document(db: Session, title: str, content: str, summary: str, chunks:
         db.add(db_doc)
         db.commit()
         db.refresh(db_doc)
+        # SQLite reuses the id of a just-deleted newest document; never let its leftover matrix
+        # (same chunk count) stand in for this document's embeddings if the write below fails
+        _remove_doc_embeddings(db_doc.id)
 
         # OPTIMIZED: Batch insert chunks for MUCH faster inserts
         batch_size = 500  # From config
@@ -57,6 +60,9 @@ def create_document(db: Session, title: str, content: str, summary: str, chunks:
             db.commit()
             logger.info(f"✓ Final batch inserted {len(chunk_objects)} chunks to database")
 
+        _write_doc_embeddings(db_doc.id, [chunk["embedding"] for chunk in chunks])
+        # Searches issued between batch commits may have cached a partial matrix
+        invalidate_doc_matches(db_doc.id)
         logger.info(f"✓ Document {db_doc.id} created with {len(chunks)} chunks total")
         return db_doc
 
@@ -133,6 +139,8 @@ def delete_document(db: Session, doc_id: int) -> bool:
         if doc:
             db.delete(doc)
             db.commit()
+            invalidate_doc_matches(doc_id)
+            _remove_doc_embeddings(doc_id)
             logger.info(f"Deleted document {doc_id}")
             return True
         return False
@@ -175,6 +183,226 @@ def _parse_chunk_metadata(text: str) -> Dict[str, Any]:
     }
 
 # ------------------ Search chunks ------------------
+class ChunkMatches(NamedTuple):
+    """Parallel (struct-of-arrays) view of the candidate chunks for one search."""
+    texts: List[str]
+    doc_ids: List[Optional[int]]
+    doc_titles: List[Optional[str]]
+    page_numbers: List[Optional[int]]
+    paragraph_numbers: List[Optional[int]]
+    embeddings: np.ndarray  # (N, D) float32, rows L2-normalized
+
+
+# Per-document candidate cache for intra-doc searches (doc_id -> (signature, ChunkMatches)).
+# Other workers can delete or re-create a document (SQLite reuses ids), so every hit is
+# checked against the document's current signature in the database.
+_DOC_MATCHES_CACHE_SIZE = 64
+_doc_matches_cache: "OrderedDict[int, tuple]" = OrderedDict()
+_doc_matches_lock = threading.Lock()
+
+
+def _doc_signature(db: Session, doc_id: int) -> Optional[tuple]:
+    """(created_at, chunk count, max chunk id) for a document, or None if it doesn't exist; one indexed query"""
+    row = (
+        db.query(models.Document.created_at, func.count(models.Chunk.id), func.max(models.Chunk.id))
+        .outerjoin(models.Chunk, models.Chunk.doc_id == models.Document.id)
+        .filter(models.Document.id == doc_id)
+        .group_by(models.Document.id)
+        .first()
+    )
+    return tuple(row) if row is not None else None
+
+
+def invalidate_doc_matches(doc_id: Optional[int] = None):
+    """Drop the cached search matrix for one document (or all documents)"""
+    with _doc_matches_lock:
+        if doc_id is None:
+            _doc_matches_cache.clear()
+        else:
+            _doc_matches_cache.pop(doc_id, None)
+
+
+def _doc_embeddings_path(doc_id: int) -> str:
+    return os.path.join(settings.embedding_store_dir, f"{doc_id}.npy")
+
+
+def _write_doc_embeddings(doc_id: int, embeddings: List[Any]):
+    """Persist a document's normalized (N, D) float32 matrix, rows in chunk insertion (id) order"""
+    if not embeddings:
+        return
+    try:
+        dim = len(embeddings[0])
+        mat = _embedding_matrix(embeddings, dim)
+        os.makedirs(settings.embedding_store_dir, exist_ok=True)
+        path = _doc_embeddings_path(doc_id)
+        tmp_path = f"{path}.tmp.npy"
+        np.save(tmp_path, mat)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logger.warning(f"Could not write embedding matrix for document {doc_id}: {e}")
+
+
+def _remove_doc_embeddings(doc_id: int):
+    try:
+        os.remove(_doc_embeddings_path(doc_id))
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Could not remove embedding matrix for document {doc_id}: {e}")
+
+
+def _mapped_doc_embeddings(doc_id: int, rows: int, dim: int) -> Optional[np.ndarray]:
+    """Zero-copy (rows, dim) view of a document's stored matrix, or None if absent/stale"""
+    try:
+        mat = np.load(_doc_embeddings_path(doc_id), mmap_mode="r")
+    except (FileNotFoundError, ValueError, OSError):
+        return None
+    if mat.dtype != np.float32 or mat.shape != (rows, dim):
+        return None
+    return mat
+
+
+def _embedding_matrix(embeddings: List[Any], dim: int) -> np.ndarray:
+    """Stack stored embeddings into a contiguous (N, D) float32 matrix with unit-length rows.
+    Rows that are missing or have the wrong dimension are left as zeros (score 0.0)."""
+    try:
+        mat = np.array(embeddings, dtype=np.float32)
+        if mat.ndim != 2 or mat.shape[1] != dim:
+            raise ValueError("ragged embeddings")
+    except (TypeError, ValueError):
+        mat = np.zeros((len(embeddings), dim), dtype=np.float32)
+        for i, emb in enumerate(embeddings):
+            try:
+                row = np.asarray(emb, dtype=np.float32)
+                if row.shape == (dim,):
+                    mat[i] = row
+                else:
+                    logger.warning(f"Skipping chunk embedding with shape {row.shape}, expected ({dim},)")
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Failed to read chunk embedding: {e}")
+
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    np.divide(mat, norms, out=mat, where=norms > 0)
+    return np.ascontiguousarray(mat)
+
+
+def _collect_chunk_matches(db: Session, chunks: List[models.Chunk], dim: int, doc_id: Optional[int] = None) -> ChunkMatches:
+    texts, doc_ids, doc_titles, page_numbers, paragraph_numbers = [], [], [], [], []
+    for c in chunks:
+        metadata = _parse_chunk_metadata(c.text or "")
+        texts.append(metadata.get("text", c.text))
+        doc_ids.append(c.doc_id)
+        doc_titles.append(c.document.title if c.document else None)
+        page_numbers.append(metadata.get("page_number"))
+        paragraph_numbers.append(metadata.get("paragraph_number"))
+
+    # Single-document searches read the memory-mapped matrix written at ingestion;
+    # otherwise stack the packed per-row blobs
+    if doc_id:
+        matrix = _mapped_doc_embeddings(doc_id, len(chunks), dim)
+        if matrix is None:
+            # The embedding column was deferred for this query; fetch the blobs in one round trip
+            blobs = (
+                db.query(models.Chunk.embedding)
+                .filter(models.Chunk.doc_id == doc_id)
+                .order_by(models.Chunk.id)
+                .all()
+            )
+            matrix = _embedding_matrix([blob for (blob,) in blobs], dim)
+    else:
+        matrix = _embedding_matrix([c.embedding for c in chunks], dim)
+
+    return ChunkMatches(
+        texts=texts,
+        doc_ids=doc_ids,
+        doc_titles=doc_titles,
+        page_numbers=page_numbers,
+        paragraph_numbers=paragraph_numbers,
+        embeddings=matrix,
+    )
+
+
+def _load_chunk_matches(db: Session, dim: int, doc_id: Optional[int] = None) -> Optional[ChunkMatches]:
+    """Load search candidates, serving single-document searches from the in-process cache"""
+    signature = None
+    if doc_id:
+        signature = _doc_signature(db, doc_id)
+        if signature is None:
+            invalidate_doc_matches(doc_id)
+            return None
+        with _doc_matches_lock:
+            cached = _doc_matches_cache.get(doc_id)
+            if cached is not None and cached[0] == signature and cached[1].embeddings.shape[1] == dim:
+                _doc_matches_cache.move_to_end(doc_id)
+                return cached[1]
+
+    # Ordered by id so rows line up with the per-document matrix written at ingestion
+    query = db.query(models.Chunk).options(joinedload(models.Chunk.document)).order_by(models.Chunk.id)
+
+    # Filter by document if specified; its embeddings normally come from the mapped matrix
+    if doc_id:
+        query = query.filter(models.Chunk.doc_id == doc_id).options(defer(models.Chunk.embedding))
+
+    chunks = query.all()
+    if not chunks:
+        return None
+
+    matches = _collect_chunk_matches(db, chunks, dim, doc_id)
+    if doc_id:
+        with _doc_matches_lock:
+            # Signature was read before the chunks: a concurrent change only makes the next check miss
+            _doc_matches_cache[doc_id] = (signature, matches)
+            _doc_matches_cache.move_to_end(doc_id)
+            if len(_doc_matches_cache) > _DOC_MATCHES_CACHE_SIZE:
+                _doc_matches_cache.popitem(last=False)
+    return matches
+
+
+def _page_mask(page_numbers: List[Optional[int]], page_range: Dict[str, Optional[int]]) -> np.ndarray:
+    """Rows inside the page range; chunks without a page marker always match"""
+    start_page = page_range.get("start")
+    end_page = page_range.get("end")
+    return np.fromiter(
+        (
+            p is None or (
+                (start_page is None or p >= start_page) and
+                (end_page is None or p <= end_page)
+            )
+            for p in page_numbers
+        ),
+        dtype=bool,
+        count=len(page_numbers),
+    )
+
+
+def _search_chunks_pgvector(
+    db: Session,
+    query_emb: np.ndarray,
+    top_k: int,
+    offset: int,
+    doc_id: Optional[int],
+) -> List[Dict[str, Any]]:
+    """Rank chunks in PostgreSQL by pgvector cosine distance (HNSW index)"""
+    distance = models.Chunk.embedding.op("<=>", return_type=Float)(query_emb)
+    query = db.query(models.Chunk, distance.label("distance")).options(joinedload(models.Chunk.document))
+    if doc_id:
+        query = query.filter(models.Chunk.doc_id == doc_id)
+    rows = query.order_by(distance).offset(offset).limit(top_k).all()
+
+    results = []
+    for chunk, dist in rows:
+        metadata = _parse_chunk_metadata(chunk.text or "")
+        results.append({
+            "text": metadata.get("text", chunk.text),
+            "doc_id": chunk.doc_id,
+            "doc_title": chunk.document.title if chunk.document else None,
+            "page_number": metadata.get("page_number"),
+            "paragraph_number": metadata.get("paragraph_number"),
+            "score": 1.0 - float(dist)
+        })
+    return results
+
+
 def search_chunks(
     db: Session,
     query_embedding: list,
@@ -184,60 +412,53 @@ def search_chunks(
     page_range: Optional[Dict[str, Optional[int]]] = None
 ) -> List[Dict[str, Any]]:
     """
-    Optimized search with early termination and batch processing.
-    Uses in-memory cosine similarity for now (works fine for small/mid scale).
-    If scaling up, switch to pgvector or FAISS for ANN search.
+    Optimized search with vectorized scoring.
+    Candidates are held as parallel arrays with pre-normalized embeddings, so cosine
+    similarity is one matrix-vector product; result dicts are only built for the
+    requested page of results. Per-document candidates are cached in-process.
+    With use_pgvector on PostgreSQL, ranking runs in the database instead
+    (page-range searches still filter in Python, since pages live in chunk text).
     """
-    query = db.query(models.Chunk).options(joinedload(models.Chunk.document))
+    query_emb = np.asarray(query_embedding, dtype=np.float32)
+    if not page_range and models.uses_pgvector(db.get_bind().dialect):
+        return _search_chunks_pgvector(db, query_emb, top_k, offset, doc_id)
 
-    # Filter by document if specified
-    if doc_id:
-        query = query.filter(models.Chunk.doc_id == doc_id)
-
-    chunks = query.all()
-    if not chunks:
+    matches = _load_chunk_matches(db, query_emb.shape[0], doc_id)
+    if matches is None:
         return []
 
-    # Convert query embedding to numpy for faster computation
-    query_emb = np.array(query_embedding, dtype=np.float32)
-    
-    results = []
-    for c in chunks:
-        try:
-            # Faster vectorized cosine similarity
-            chunk_emb = np.array(c.embedding, dtype=np.float32)
-            score = float(np.dot(query_emb, chunk_emb) / (np.linalg.norm(query_emb) * np.linalg.norm(chunk_emb)))
-        except Exception as e:
-            logger.warning(f"Failed to compute similarity for chunk {c.id}: {e}")
-            score = 0.0
+    query_norm = np.linalg.norm(query_emb)
+    if query_norm > 0:
+        query_emb = query_emb / query_norm
+    scores = matches.embeddings @ query_emb
+
+    candidates = np.arange(len(scores))
+    if page_range:
+        candidates = candidates[_page_mask(matches.page_numbers, page_range)]
+        if candidates.size == 0:
+            return []
+
+    # Partial top-k selection, then a stable sort of just that window for pagination
+    k = offset + top_k
+    cand_scores = scores[candidates]
+    if k < cand_scores.size:
+        top = np.argpartition(-cand_scores, k - 1)[:k]
+        top = top[np.argsort(-cand_scores[top], kind="stable")]
+    else:
+        top = np.argsort(-cand_scores, kind="stable")
+    order = candidates[top[offset:k]]
 
-        metadata = _parse_chunk_metadata(c.text or "")
-        page_number = metadata.get("page_number")
-        paragraph_number = metadata.get("paragraph_number")
-
-        if page_range:
-            start_page = page_range.get("start")
-            end_page = page_range.get("end")
-            if page_number is not None:
-                if start_page is not None and page_number < start_page:
-                    continue
-                if end_page is not None and page_number > end_page:
-                    continue
-        
-        results.append({
-            "text": metadata.get("text", c.text),
-            "doc_id": c.doc_id,
-            "doc_title": c.document.title if c.document else None,
-            "page_number": page_number,
-            "paragraph_number": paragraph_number,
-            "score": score
-        })
-
-    # Sort by similarity and apply pagination
-    results = sorted(results, key=lambda x: x["score"], reverse=True)
-    start_idx = offset
-    end_idx = offset + top_k
-    return results[start_idx:end_idx]
+    return [
+        {
+            "text": matches.texts[i],
+            "doc_id": matches.doc_ids[i],
+            "doc_title": matches.doc_titles[i],
+            "page_number": matches.page_numbers[i],
+            "paragraph_number": matches.paragraph_numbers[i],
+            "score": float(scores[i])
+        }
+        for i in order
+    ]
 
 def count_chunks(db: Session) -> int:
     """Count total chunks"""
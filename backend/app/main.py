@@ -19,6 +19,15 @@ import hashlib
 import secrets
 from datetime import timedelta
 
+# orjson is optional: faster (de)serialization for JWT claims and JSON responses
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse
+except ImportError:
+    orjson = None
+    ORJSONResponse = JSONResponse
+_json_loads = orjson.loads if orjson else json.loads  # both accept bytes
+
 # Relative imports for proper module structure
 from . import db, crud, schemas, models
 from .config import settings
@@ -65,7 +74,8 @@ logger.info("Using local models as primary + GROQ for dual answers" if groq_clie
 app = FastAPI(
     title="AI Document Search Tool",
     description="AI-powered document search with semantic understanding",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware (accept str or list in settings.allowed_origins)
@@ -735,11 +745,8 @@ def auth_me(request: Request, token: Optional[str] = None):
             payload = token.split('.')[1]
             # base64 decode with padding
             import base64
-            rem = len(payload) % 4
-            if rem > 0:
-                payload += '=' * (4 - rem)
-            decoded = base64.urlsafe_b64decode(payload.encode('utf-8'))
-            obj = json.loads(decoded.decode('utf-8'))
+            decoded = base64.urlsafe_b64decode(payload + '=' * (-len(payload) & 3))
+            obj = _json_loads(decoded)
             return JSONResponse({"email": obj.get('email'), "name": obj.get('name') or obj.get('preferred_username')}, status_code=200)
 
         # Not supported token type - ask user to use frontend-callback user param
@@ -836,11 +843,9 @@ def auth_google(payload: dict, db: Session = Depends(get_db)):
                 raise ValueError("Invalid JWT format")
             # Decode payload
             payload_b64 = parts[1]
-            # Add padding if needed
-            padding = 4 - len(payload_b64) % 4
-            if padding != 4:
-                payload_b64 += '=' * padding
-            payload_json = json.loads(__import__('base64').urlsafe_b64decode(payload_b64))
+            # Pad to a multiple of 4 (0-3 '=' characters)
+            payload_b64 += '=' * (-len(payload_b64) & 3)
+            payload_json = _json_loads(__import__('base64').urlsafe_b64decode(payload_b64))
             email = (payload_json.get('email') or '').lower().strip()
             if not email:
                 raise ValueError("No email in token")
@@ -1008,8 +1013,11 @@ def search_documents(
 
         logger.info(f"Search query: '{q}' (limit={limit}, offset={offset}, doc_id={doc_id})")
 
-        # Generate query embedding - always fresh for accuracy
-        query_emb = active_ai_utils.generate_embedding(q)
+        # Generate query embedding, reusing it for repeated (normalized) queries
+        query_emb = cache_manager.get_query_embedding(q)
+        if query_emb is None:
+            query_emb = active_ai_utils.generate_embedding(cache_manager.normalize_query(q))
+            cache_manager.cache_query_embedding(q, query_emb)
 
         page_range_obj: Optional[dict] = None
         if page_range == "specific" and specific_page is not None:
@@ -1132,8 +1140,8 @@ def search_documents(
 
         # Extract contexts for answer generation
         context_count = min(8, len(reranked))
-        contexts = [r.get("text", "") for r in reranked[:context_count]]
         selected_chunks = reranked[:context_count]
+        contexts = [r.get("text", "") for r in selected_chunks]
         
         # Generate dual answers: Local Models + GROQ
         dual_answer_info = None
@@ -1160,9 +1168,8 @@ def search_documents(
             logger.info(f"Dual answers - Local: {dual_result['local_answer'][:50]}... | GROQ: {dual_result['groq_answer'][:50]}... | Selected: {dual_result['source']} ({dual_result['selection_reason']})")
         else:
             # Fallback to local only (your existing system)
-            # Convert contexts from list of dicts to list of strings for synthesize_answer
-            context_strings = [r.get("text", "") for r in reranked[:context_count]]
-            context_dicts = [{"text": ctx} for ctx in context_strings]
+            # synthesize_answer expects dicts; reuse the already-extracted context strings
+            context_dicts = [{"text": ctx} for ctx in contexts]
             answer = (active_ai_utils.synthesize_answer(q, context_dicts, answer_length=answer_length, answer_mode=answer_mode) or "").strip()
             
             # Create dual answer info indicating local-only mode
@@ -1193,7 +1200,7 @@ def search_documents(
                 doc_id=r.get("doc_id"),
                 doc_title=r.get("doc_title", f"Document {r.get('doc_id')}")
             )
-            for r in reranked[:context_count]
+            for r in selected_chunks
             if r.get("doc_id") is not None
         ]
 
@@ -1679,7 +1686,7 @@ def compare_documents(doc_ids: List[int], db: Session = Depends(get_db)):
                 documents.append({
                     "id": doc.id,
                     "title": doc.title,
-                    "chunks": [{"id": c.id, "text": c.text, "embedding": c.embedding} for c in doc.chunks[:15]]
+                    "chunks": [{"id": c.id, "text": c.text, "embedding": c.get_embedding().tolist()} for c in doc.chunks[:15]]
                 })
         
         if len(documents) < 2:
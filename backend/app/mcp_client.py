@@ -4,13 +4,18 @@ Combines local models (via MCP) + Groq API with intelligent selection
 """
 
 import asyncio
+import base64
+import concurrent.futures
+import hashlib
 import json
-import subprocess
+import struct
 import sys
 import os
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Deque, Dict, List, Optional, Tuple
 import threading
 import time
+from collections import OrderedDict, deque
+from array import array
 
 # The 'mcp' package may not be installed in some environments (it's optional).
 # Import it conditionally and provide safe fallbacks so the backend can start
@@ -25,27 +30,186 @@ except Exception:
     async def stdio_client(*args, **kwargs):  # type: ignore
         raise RuntimeError("mcp client not available")
 
+# Network transports for a long-running MCP server (MCP_TRANSPORT=http|sse); each tool
+# call is its own HTTP request, so concurrent calls don't serialize on one stdio pipe.
+try:
+    from mcp.client.streamable_http import streamablehttp_client
+except Exception:
+    streamablehttp_client = None
+
+try:
+    from mcp.client.sse import sse_client
+except Exception:
+    sse_client = None
+
 # Groq API for direct calls
 try:
     from groq import Groq
 except ImportError:
     Groq = None
 
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# rapidfuzz gives a C-speed similarity score for the judge shortcut; token Jaccard otherwise
+try:
+    from rapidfuzz import fuzz
+except ImportError:
+    fuzz = None
+
+# orjson parses large embedding/rerank payloads several times faster (accepts str or bytes)
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 from .logger import logger
 from .config import settings
 
+# Prompts are built once at import; per-call work is only the .format() of the variable parts
+SYSTEM_PROMPT = """You are an expert AI assistant with advanced analytical capabilities. Your mission is to provide highly accurate, comprehensive, and detailed answers based on the given context.
+
+Instructions:
+- Extract and analyze ALL relevant information from the context
+- Provide specific details including numbers, dates, names, scores, and percentages
+- Explain the significance and meaning of any data mentioned
+- Structure your response clearly and logically
+- For academic documents: interpret grades, scores, and achievements accurately
+- For official documents: explain the content and its implications
+- Always provide complete context and background information
+
+Deliver a thorough, well-structured response that demonstrates deep understanding."""
+
+ANSWER_PROMPT_TEMPLATE = """Context:
+{context_text}
+
+Question: {query}
+
+Provide a detailed answer based on the context above."""
+
+COMPARISON_PROMPT_TEMPLATE = """You are an expert judge evaluating two AI-generated answers to the same question.
+
+Question: {query}
+
+Answer A (Local Model):
+{local_answer}
+
+Answer B (Groq Model):
+{groq_answer}
+
+Evaluate both answers based on:
+1. Accuracy and factual correctness
+2. Completeness and thoroughness  
+3. Clarity and coherence
+4. Relevance to the question
+
+Respond with:
+1. The letter of the better answer (A or B)
+2. A brief explanation (1-2 sentences)
+
+Format: "Winner: [A/B] - [explanation]"
+"""
+
+ANSWER_AND_JUDGE_PROMPT_TEMPLATE = """You are an expert AI assistant and impartial judge.
+
+Context:
+{context_text}
+
+Question: {query}
+
+Answer A (Local Model):
+{local_answer}
+
+Tasks:
+1. Write your own detailed, accurate answer (Answer B) based only on the context above. Include specific numbers, dates, names and scores where relevant.
+2. Compare Answer A and Answer B on accuracy, completeness, clarity and relevance to the question.
+
+Respond with a JSON object only:
+{{"groq_answer": "<Answer B>", "winner": "A" or "B", "reason": "<1-2 sentence explanation>"}}"""
+
+
+def _decode_embedding_matrix(payload: str) -> List[List[float]]:
+    """Decode generate_embeddings_batch_bin output: base64 of a '<II' (rows, dim) header
+    followed by little-endian float32 rows"""
+    raw = base64.b64decode(payload)
+    rows, dim = struct.unpack_from("<II", raw)
+    values = array("f")
+    values.frombytes(raw[8:8 + rows * dim * 4])
+    if sys.byteorder == "big":
+        values.byteswap()
+    flat = values.tolist()
+    return [flat[i * dim:(i + 1) * dim] for i in range(rows)]
+
+
+def _answer_similarity(a: str, b: str) -> float:
+    """0-100 similarity between two answers"""
+    if fuzz is not None:
+        return fuzz.token_set_ratio(a, b)
+    tokens_a, tokens_b = set(a.lower().split()), set(b.lower().split())
+    if not tokens_a or not tokens_b:
+        return 0.0
+    return 100.0 * len(tokens_a & tokens_b) / len(tokens_a | tokens_b)
+
+
+def _context_text(contexts: List[str]) -> str:
+    """Context block shared by every Groq prompt built for one query"""
+    return "\n\n".join(contexts[:4])
+
+
 class MCPClient:
     """Dual MCP Client: Local models + Groq API with intelligent answer selection"""
     
     def __init__(self):
         self.mcp_session: Optional[ClientSession] = None
-        self.mcp_process: Optional[subprocess.Popen] = None
+        # Task that owns the stdio child process + session; runs until _mcp_shutdown is set
+        self._mcp_owner_task: Optional[asyncio.Task] = None
+        self._mcp_shutdown: Optional[asyncio.Event] = None
+        self._mcp_heartbeat_interval = float(os.getenv("MCP_HEARTBEAT_SECONDS", "30"))
         self.groq_client: Optional[Groq] = None
+        self._http_client = None  # shared keep-alive pool for all Groq requests
+        # Last failure time per Groq model; recently failed models are skipped in fallback loops
+        self._model_health: Dict[str, float] = {}
+        self._model_cooldown = 60.0
+        self._groq_attempt_timeout = float(os.getenv("GROQ_ATTEMPT_TIMEOUT", "10.0"))
+        # Circuit breaker: 5 Groq requests whose every fallback model failed, within 10s,
+        # bypass Groq entirely for 60s (single model errors only start that model's cooldown)
+        self._groq_failures: Deque[float] = deque(maxlen=10)
+        self._groq_breaker_until = 0.0
+        # Blocking Groq SDK calls run here, bounding Groq concurrency independently of FastAPI workers
+        self._groq_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=int(os.getenv("GROQ_MAX_WORKERS", "16")),
+            thread_name_prefix="groq"
+        )
         self._lock = threading.Lock()
         self._loop = None
         self._thread = None
         self._mcp_connected = False
         self._groq_connected = False
+        self._ready_event = threading.Event()  # set once the MCP connect attempt finishes
+        # Loop-side request pipeline: sync callers enqueue (name, args, reply_future)
+        self._req_queue: Optional[asyncio.Queue] = None
+        self._dispatch_tasks: List[asyncio.Task] = []
+        # Single-text embedding requests are coalesced into batched MCP calls
+        self._embed_batch_queue: Optional[asyncio.Queue] = None
+        self._embed_max_batch = 32
+        self._embed_batch_window = 0.005  # seconds to wait for more requests
+        # Whether the connected server lists the binary float32 batch tool; re-checked on every (re)connect
+        self._binary_embeddings = False
+        self._dispatch_concurrency = int(os.getenv("MCP_DISPATCH_CONCURRENCY", "4"))
+        # Speculatively start Groq alongside the local model; drop it if local is fast and confident.
+        # Opt-in: when Groq is needed it costs a separate judge call, where the default path
+        # answers and judges in one Groq request
+        self._speculative_groq = os.getenv("MCP_SPECULATIVE_GROQ", "false").lower() in ("true", "1", "yes")
+        self._speculative_max_local_seconds = float(os.getenv("MCP_SPECULATIVE_MAX_LOCAL_SECONDS", "3.0"))
+        self._speculative_min_words = 25
+        self._similarity_shortcut = 85.0  # skip the Groq judge above this answer similarity
+        # Result cache for embeddings, summaries and answers, keyed by a digest of the inputs
+        self._result_cache: "OrderedDict[bytes, Any]" = OrderedDict()
+        self._result_cache_lock = threading.Lock()
+        self._result_cache_size = 1024
     
     async def _start_mcp_server_and_connect(self):
         """Start local MCP server process and establish connection"""
@@ -56,22 +220,10 @@ class MCPClient:
                 self._mcp_connected = False
                 return
 
-            # Start local MCP server (your existing models)
-            server_script = settings.mcp_server_script
-            self.mcp_process = subprocess.Popen([
-                sys.executable, server_script
-            ], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-            logger.info("Local MCP server process started")
-
-            # Create client session
-            server_params = StdioServerParameters(
-                command=sys.executable,
-                args=[server_script]
-            )
-
-            self.mcp_session = await stdio_client(server_params)
-            await self.mcp_session.initialize()
+            self._mcp_shutdown = asyncio.Event()
+            connected = asyncio.get_running_loop().create_future()
+            self._mcp_owner_task = asyncio.create_task(self._own_mcp_session(connected))
+            await connected
 
             self._mcp_connected = True
             logger.info("Local MCP client connected successfully")
@@ -80,7 +232,98 @@ class MCPClient:
             logger.error(f"Failed to start local MCP server: {e}")
             self._mcp_connected = False
             raise
+        finally:
+            # Wake start() on success and failure alike
+            self._ready_event.set()
     
+    def _open_mcp_transport(self):
+        """Transport context manager selected by MCP_TRANSPORT (stdio by default)
+
+        For http/sse, run mcp_server/server.py separately with the same MCP_TRANSPORT.
+        """
+        transport = os.getenv("MCP_TRANSPORT", "stdio").lower()
+        server_url = os.getenv("MCP_SERVER_URL", "http://127.0.0.1:8765")
+
+        if transport == "http":
+            if streamablehttp_client is None:
+                raise RuntimeError("mcp streamable HTTP client not available")
+            logger.info(f"Connecting to local MCP server over HTTP at {server_url}/mcp")
+            return streamablehttp_client(f"{server_url}/mcp")
+
+        if transport == "sse":
+            if sse_client is None:
+                raise RuntimeError("mcp SSE client not available")
+            logger.info(f"Connecting to local MCP server over SSE at {server_url}/sse")
+            return sse_client(f"{server_url}/sse")
+
+        # stdio_client spawns the local MCP server (your existing models) and owns its lifetime
+        server_params = StdioServerParameters(
+            command=sys.executable,
+            args=[settings.mcp_server_script]
+        )
+        return stdio_client(server_params)
+
+    async def _own_mcp_session(self, connected: asyncio.Future):
+        """Hold the transport and session open inside one task (their context managers
+        must be entered and exited by the same task). One server process serves every
+        call; if it dies after the first connect, a new one is spawned with backoff."""
+        delay = 1.0
+        while not self._mcp_shutdown.is_set():
+            try:
+                async with self._open_mcp_transport() as streams:
+                    read_stream, write_stream = streams[0], streams[1]
+                    logger.info("Local MCP transport opened")
+                    async with ClientSession(read_stream, write_stream) as session:
+                        await session.initialize()
+                        self._binary_embeddings = await self._supports_tool(session, "generate_embeddings_batch_bin")
+                        self.mcp_session = session
+                        self._mcp_connected = True
+                        delay = 1.0
+                        if not connected.done():
+                            connected.set_result(True)
+                        await self._hold_mcp_session(session)
+            except Exception as e:
+                if not connected.done():
+                    connected.set_exception(e)
+                    return
+                logger.error(f"Local MCP session closed unexpectedly: {e}")
+            finally:
+                self.mcp_session = None
+
+            if self._mcp_shutdown.is_set():
+                break
+            self._mcp_connected = False
+            logger.info(f"Reconnecting to local MCP server in {delay:.0f}s")
+            try:
+                await asyncio.wait_for(self._mcp_shutdown.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            delay = min(delay * 2, 30.0)
+
+    @staticmethod
+    async def _supports_tool(session: ClientSession, name: str) -> bool:
+        try:
+            tools = await session.list_tools()
+            return any(tool.name == name for tool in tools.tools)
+        except Exception as e:
+            logger.warning(f"Could not list MCP tools: {e}")
+            return False
+
+    async def _hold_mcp_session(self, session: ClientSession):
+        """Keep the session open until shutdown, pinging so a dead server process is noticed"""
+        while True:
+            try:
+                await asyncio.wait_for(self._mcp_shutdown.wait(), timeout=self._mcp_heartbeat_interval)
+                return
+            except asyncio.TimeoutError:
+                await asyncio.wait_for(session.send_ping(), timeout=10)
+
+    async def _close_mcp_session(self):
+        if self._mcp_shutdown is not None:
+            self._mcp_shutdown.set()
+        if self._mcp_owner_task is not None:
+            await self._mcp_owner_task
+
     def _init_groq_client(self):
         """Initialize Groq client"""
         try:
@@ -93,7 +336,11 @@ class MCPClient:
                 logger.warning("GROQ_API_KEY not found")
                 return
             
-            self.groq_client = Groq(api_key=api_key)
+            self._http_client = self._create_http_client()
+            if self._http_client is not None:
+                self.groq_client = Groq(api_key=api_key, http_client=self._http_client)
+            else:
+                self.groq_client = Groq(api_key=api_key)
             self._groq_connected = True
             logger.info("Groq client initialized successfully")
             
@@ -101,16 +348,38 @@ class MCPClient:
             logger.error(f"Failed to initialize Groq client: {e}")
             self._groq_connected = False
     
+    def _warm_groq(self):
+        """Cheap request that populates the Groq connection pool; failures are harmless"""
+        try:
+            self.groq_client.models.list()
+            logger.info("Groq connection warmed up")
+        except Exception as e:
+            logger.debug(f"Groq warm-up failed: {e}")
+
+    @staticmethod
+    def _create_http_client():
+        """Long-lived pooled HTTP client so Groq answers and model fallbacks reuse one TLS session"""
+        if httpx is None:
+            return None
+        limits = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+        try:
+            return httpx.Client(http2=True, limits=limits, timeout=30)
+        except ImportError:
+            # HTTP/2 needs the optional 'h2' package; keep-alive over HTTP/1.1 still avoids re-handshakes
+            return httpx.Client(limits=limits, timeout=30)
+
     def _run_async_loop(self):
         """Run async event loop in separate thread"""
         self._loop = asyncio.new_event_loop()
         asyncio.set_event_loop(self._loop)
         
         try:
+            self._loop.run_until_complete(self._start_dispatch_workers())
             self._loop.run_until_complete(self._start_mcp_server_and_connect())
             self._loop.run_forever()
         except Exception as e:
             logger.error(f"Dual MCP client loop error: {e}")
+            self._ready_event.set()
         finally:
             self._loop.close()
     
@@ -122,17 +391,17 @@ class MCPClient:
             
             # Initialize Groq client (synchronous)
             self._init_groq_client()
+            if self._groq_connected:
+                # Open the pooled TLS connection now rather than on the first user query
+                threading.Thread(target=self._warm_groq, name="groq-warmup", daemon=True).start()
             
             # Start MCP server in background thread
             self._thread = threading.Thread(target=self._run_async_loop, daemon=True)
             self._thread.start()
             
-            # Wait for MCP connection
-            max_retries = 10
-            for _ in range(max_retries):
-                if self._mcp_connected:
-                    break
-                time.sleep(1)
+            # Wait for MCP connection attempt to finish
+            if not self._ready_event.wait(timeout=10):
+                logger.warning("Local MCP connection still pending after 10s")
             
             logger.info(f"Dual client status - MCP: {self._mcp_connected}, Groq: {self._groq_connected}")
     
@@ -140,11 +409,21 @@ class MCPClient:
         """Stop dual MCP client"""
         with self._lock:
             if self._loop and not self._loop.is_closed():
+                if self._mcp_owner_task is not None and self._loop.is_running():
+                    # Close the session and let stdio_client terminate the server process
+                    closing = asyncio.run_coroutine_threadsafe(self._close_mcp_session(), self._loop)
+                    try:
+                        closing.result(timeout=10)
+                    except Exception as e:
+                        logger.warning(f"Local MCP session shutdown failed: {e}")
+                    self._mcp_owner_task = None
                 self._loop.call_soon_threadsafe(self._loop.stop)
-            
-            if self.mcp_process:
-                self.mcp_process.terminate()
-                self.mcp_process.wait()
+
+            self._groq_pool.shutdown(wait=False)
+
+            if self._http_client is not None:
+                self._http_client.close()
+                self._http_client = None
             
             self._mcp_connected = False
             self._groq_connected = False
@@ -160,26 +439,124 @@ class MCPClient:
             return result.content[0].text
         return None
     
+    async def _start_dispatch_workers(self):
+        """Create the request queue and its consumers on the background loop"""
+        self._req_queue = asyncio.Queue()
+        self._dispatch_tasks = [
+            asyncio.create_task(self._dispatch_worker())
+            for _ in range(max(1, self._dispatch_concurrency))
+        ]
+        self._embed_batch_queue = asyncio.Queue()
+        self._dispatch_tasks.append(asyncio.create_task(self._embedding_batcher()))
+
+    async def _dispatch_worker(self):
+        """Consume queued tool calls; several workers keep multiple calls in flight on one session"""
+        while True:
+            name, arguments, reply = await self._req_queue.get()
+            try:
+                # Skip calls whose caller already gave up (timed out and cancelled)
+                if not reply.set_running_or_notify_cancel():
+                    continue
+                try:
+                    reply.set_result(await self._call_mcp_tool_async(name, arguments))
+                except Exception as e:
+                    reply.set_exception(e)
+            finally:
+                self._req_queue.task_done()
+
+    async def _embed_batch_async(self, texts: List[str]) -> List[List[float]]:
+        """Batch embeddings over MCP, preferring the compact binary transport"""
+        if self._binary_embeddings:
+            try:
+                result = await self._call_mcp_tool_async("generate_embeddings_batch_bin", {"texts": texts})
+                return _decode_embedding_matrix(result) if result else []
+            except Exception as e:
+                # Transient (timeout, reconnect, decode); support is decided from list_tools, so keep using it
+                logger.warning(f"Binary embedding call failed, retrying as JSON: {e}")
+
+        result = await self._call_mcp_tool_async("generate_embeddings_batch", {"texts": texts})
+        return _json_loads(result) if result else []
+
+    async def _embedding_batcher(self):
+        """Collect embedding requests for a few ms and send them as one generate_embeddings_batch call"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._embed_batch_queue.get()]
+            deadline = loop.time() + self._embed_batch_window
+            while len(batch) < self._embed_max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._embed_batch_queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            pending = [(text, reply) for text, reply in batch if reply.set_running_or_notify_cancel()]
+            if not pending:
+                continue
+
+            # Identical texts in one window share a single row
+            unique_texts = list(dict.fromkeys(text for text, _ in pending))
+            try:
+                rows = dict(zip(unique_texts, await self._embed_batch_async(unique_texts)))
+                for text, reply in pending:
+                    reply.set_result(rows.get(text, []))
+            except Exception as e:
+                for _, reply in pending:
+                    reply.set_exception(e)
+
     def _call_mcp_tool_sync(self, name: str, arguments: dict) -> Any:
         """Call local MCP tool synchronously"""
-        if not self._mcp_connected:
+        if not self._mcp_connected or self._req_queue is None:
             raise Exception("Local MCP client not connected")
         
-        future = asyncio.run_coroutine_threadsafe(
-            self._call_mcp_tool_async(name, arguments), 
-            self._loop
-        )
+        reply: concurrent.futures.Future = concurrent.futures.Future()
+        self._loop.call_soon_threadsafe(self._req_queue.put_nowait, (name, arguments, reply))
         
         try:
-            result = future.result(timeout=30)
-            return result
-        except asyncio.TimeoutError:
+            return reply.result(timeout=30)
+        except concurrent.futures.TimeoutError:
+            reply.cancel()
             logger.error(f"Local MCP tool call timeout: {name}")
             raise Exception(f"Local MCP tool call timeout: {name}")
     
-    def _generate_groq_answer(self, query: str, contexts: List[str]) -> str:
-        """Generate answer using Groq API directly with model fallback"""
-        if not self._groq_connected:
+    def _models_to_attempt(self, models: List[str]) -> List[str]:
+        """Models not failed within the cooldown; if all are cooling down, only the one that failed longest ago"""
+        now = time.time()
+        healthy = [m for m in models if now - self._model_health.get(m, 0) >= self._model_cooldown]
+        return healthy or [min(models, key=lambda m: self._model_health.get(m, 0))]
+
+    def _mark_model_failed(self, model: str):
+        self._model_health[model] = time.time()
+
+    def _record_groq_failure(self):
+        """Count one fully failed fallback loop toward the circuit breaker"""
+        now = time.time()
+        self._groq_failures.append(now)
+        if len(self._groq_failures) >= 5 and now - self._groq_failures[-5] <= 10:
+            self._groq_breaker_until = now + 60
+            self._groq_failures.clear()
+            logger.warning("Groq circuit breaker open - bypassing Groq for 60s")
+
+    def _groq_available(self) -> bool:
+        return self._groq_connected and time.time() >= self._groq_breaker_until
+
+    def _groq_create(self, model: str, **kwargs):
+        """chat.completions.create with a short per-attempt timeout so fallbacks kick in quickly"""
+        return self.groq_client.with_options(timeout=self._groq_attempt_timeout).chat.completions.create(
+            model=model, **kwargs
+        )
+
+    def _generate_groq_answer(
+        self,
+        query: str,
+        context_text: str,
+        cancel_event: Optional[threading.Event] = None
+    ) -> str:
+        """Generate answer using Groq API directly with model fallback.
+        The response is streamed so decoding stops as soon as cancel_event is set."""
+        if not self._groq_available():
             return "Groq not available"
         
         # List of models to try in order (MOST POWERFUL FIRST)
@@ -190,79 +567,60 @@ class MCPClient:
             "gemma2-9b-it"              # Additional option
         ]
         
-        context_text = "\n\n".join(contexts[:4])
-        
-        system_prompt = """You are an expert AI assistant with advanced analytical capabilities. Your mission is to provide highly accurate, comprehensive, and detailed answers based on the given context.
+        user_prompt = ANSWER_PROMPT_TEMPLATE.format(context_text=context_text, query=query)
 
-Instructions:
-- Extract and analyze ALL relevant information from the context
-- Provide specific details including numbers, dates, names, scores, and percentages
-- Explain the significance and meaning of any data mentioned
-- Structure your response clearly and logically
-- For academic documents: interpret grades, scores, and achievements accurately
-- For official documents: explain the content and its implications
-- Always provide complete context and background information
-
-Deliver a thorough, well-structured response that demonstrates deep understanding."""
-        
-        user_prompt = f"""Context:
-{context_text}
-
-Question: {query}
-
-Provide a detailed answer based on the context above."""
-
-        for model in models_to_try:
+        for model in self._models_to_attempt(models_to_try):
+            if not self._groq_available():
+                break
             try:
-                completion = self.groq_client.chat.completions.create(
-                    model=model,
+                completion = self._groq_create(
+                    model,
                     messages=[
-                        {"role": "system", "content": system_prompt},
+                        {"role": "system", "content": SYSTEM_PROMPT},
                         {"role": "user", "content": user_prompt}
                     ],
                     temperature=0.3,
                     max_tokens=800,
                     top_p=0.9,
-                    stream=False
+                    stream=True
                 )
+
+                parts = []
+                for chunk in completion:
+                    if cancel_event is not None and cancel_event.is_set():
+                        close = getattr(completion, "close", None)
+                        if close:
+                            close()
+                        logger.info(f"Groq model {model} stream cancelled")
+                        return "Groq cancelled"
+                    if chunk.choices:
+                        parts.append(chunk.choices[0].delta.content or "")
                 
                 logger.info(f"Successfully used Groq model: {model}")
-                return completion.choices[0].message.content.strip()
+                return "".join(parts).strip()
                 
             except Exception as e:
+                self._mark_model_failed(model)
                 logger.warning(f"Groq model {model} failed: {e}")
                 continue
+        else:
+            self._record_groq_failure()
         
         return "Groq error: All models failed"
     
     def _compare_answers_with_groq(self, query: str, local_answer: str, groq_answer: str) -> Tuple[str, str]:
         """Use Groq to compare and select the best answer"""
-        if not self._groq_connected:
+        if not self._groq_available():
             return local_answer, "local (Groq unavailable)"
+
+        # Near-identical answers need no judge round trip
+        if _answer_similarity(local_answer, groq_answer) > self._similarity_shortcut:
+            return groq_answer, "groq (high-similarity shortcut)"
         
         try:
-            comparison_prompt = f"""You are an expert judge evaluating two AI-generated answers to the same question.
-
-Question: {query}
-
-Answer A (Local Model):
-{local_answer}
-
-Answer B (Groq Model):
-{groq_answer}
-
-Evaluate both answers based on:
-1. Accuracy and factual correctness
-2. Completeness and thoroughness  
-3. Clarity and coherence
-4. Relevance to the question
-
-Respond with:
-1. The letter of the better answer (A or B)
-2. A brief explanation (1-2 sentences)
-
-Format: "Winner: [A/B] - [explanation]"
-"""
+            comparison_prompt = COMPARISON_PROMPT_TEMPLATE.format(
+                query=query, local_answer=local_answer, groq_answer=groq_answer
+            )
 
             # Try models with fallback - POWERFUL MODELS FIRST
             models_to_try = [
@@ -271,10 +629,12 @@ Format: "Winner: [A/B] - [explanation]"
                 "mixtral-8x7b-32768"
             ]
             
-            for model in models_to_try:
+            for model in self._models_to_attempt(models_to_try):
+                if not self._groq_available():
+                    return local_answer, "local (Groq unavailable)"
                 try:
-                    completion = self.groq_client.chat.completions.create(
-                        model=model,  # Use fallback models
+                    completion = self._groq_create(
+                        model,  # Use fallback models
                         messages=[
                             {"role": "user", "content": comparison_prompt}
                         ],
@@ -284,10 +644,12 @@ Format: "Winner: [A/B] - [explanation]"
                     )
                     break
                 except Exception as e:
+                    self._mark_model_failed(model)
                     logger.warning(f"Comparison model {model} failed: {e}")
                     continue
             else:
-                return "local", "Groq comparison failed"
+                self._record_groq_failure()
+                return local_answer, "local (Groq comparison failed)"
             
             result = completion.choices[0].message.content.strip()
             
@@ -303,64 +665,260 @@ Format: "Winner: [A/B] - [explanation]"
             logger.error(f"Answer comparison failed: {e}")
             return local_answer, "local (comparison failed)"
     
+    def _generate_and_judge_with_groq(self, query: str, context_text: str, local_answer: str) -> Tuple[str, str]:
+        """Single Groq call: produce its own answer and judge it against the local answer"""
+        if not self._groq_available():
+            return local_answer, "local (Groq unavailable)"
+
+        prompt = ANSWER_AND_JUDGE_PROMPT_TEMPLATE.format(
+            context_text=context_text, query=query, local_answer=local_answer
+        )
+
+        # Try models with fallback - POWERFUL MODELS FIRST
+        models_to_try = [
+            "llama-3.1-70b-versatile",
+            "llama-3.1-8b-instant",
+            "mixtral-8x7b-32768"
+        ]
+
+        for model in self._models_to_attempt(models_to_try):
+            if not self._groq_available():
+                break
+            try:
+                completion = self._groq_create(
+                    model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.2,
+                    max_tokens=950,
+                    response_format={"type": "json_object"},
+                    stream=False
+                )
+                verdict = _json_loads(completion.choices[0].message.content)
+                groq_answer = (verdict.get("groq_answer") or "").strip()
+                winner = str(verdict.get("winner", "")).strip().upper()
+                reason = verdict.get("reason") or "selected by Groq"
+                logger.info(f"Successfully used Groq model for answer+judge: {model}")
+                logger.info(f"Groq answer: {groq_answer[:100]}...")
+
+                if winner == "B" and groq_answer:
+                    return groq_answer, f"groq ({reason})"
+                if winner == "A":
+                    return local_answer, f"local ({reason})"
+                # Fallback to local if verdict unclear
+                return local_answer, "local (comparison unclear)"
+
+            except Exception as e:
+                self._mark_model_failed(model)
+                logger.warning(f"Groq answer+judge model {model} failed: {e}")
+                continue
+        else:
+            self._record_groq_failure()
+
+        return local_answer, "local (Groq comparison failed)"
+    
+    # Result cache helpers
+    @staticmethod
+    def _cache_key(name: str, *parts: str) -> bytes:
+        return hashlib.blake2b("\x1f".join((name,) + parts).encode("utf-8"), digest_size=16).digest()
+
+    def _cache_get(self, key: bytes) -> Any:
+        with self._result_cache_lock:
+            value = self._result_cache.get(key)
+            if value is not None:
+                self._result_cache.move_to_end(key)
+            return value
+
+    def _cache_put(self, key: bytes, value: Any):
+        with self._result_cache_lock:
+            self._result_cache[key] = value
+            self._result_cache.move_to_end(key)
+            if len(self._result_cache) > self._result_cache_size:
+                self._result_cache.popitem(last=False)
+
     # Implement interface methods
     def generate_embedding(self, text: str) -> List[float]:
         """Generate embedding via local MCP"""
-        if self._mcp_connected:
+        key = self._cache_key("generate_embedding", text)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        if self._mcp_connected and self._embed_batch_queue is not None:
             try:
-                result = self._call_mcp_tool_sync("generate_embedding", {"text": text})
-                return json.loads(result) if result else []
+                reply: concurrent.futures.Future = concurrent.futures.Future()
+                self._loop.call_soon_threadsafe(self._embed_batch_queue.put_nowait, (text, reply))
+                try:
+                    embedding = reply.result(timeout=30)
+                except concurrent.futures.TimeoutError:
+                    reply.cancel()
+                    logger.error("Local MCP embedding timeout")
+                    raise
+                if embedding:
+                    self._cache_put(key, embedding)
+                return embedding
             except:
                 pass
         return []
     
     def generate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings batch via local MCP"""
+        """Generate embeddings batch via local MCP, only sending texts that aren't cached"""
+        keys = [self._cache_key("generate_embedding", text) for text in texts]
+        embeddings: List[Optional[List[float]]] = [self._cache_get(key) for key in keys]
+        misses = [i for i, emb in enumerate(embeddings) if emb is None]
+        if not misses:
+            return embeddings
+
         if self._mcp_connected:
             try:
-                result = self._call_mcp_tool_sync("generate_embeddings_batch", {"texts": texts})
-                return json.loads(result) if result else []
+                future = asyncio.run_coroutine_threadsafe(
+                    self._embed_batch_async([texts[i] for i in misses]), self._loop
+                )
+                try:
+                    fresh = future.result(timeout=30)
+                except concurrent.futures.TimeoutError:
+                    future.cancel()
+                    logger.error("Local MCP batch embedding timeout")
+                    raise
+                if len(fresh) != len(misses):
+                    return []
+                # Stitch the fresh rows back into their original positions
+                for i, emb in zip(misses, fresh):
+                    embeddings[i] = emb
+                    if emb:
+                        self._cache_put(keys[i], emb)
+                return embeddings
             except:
                 pass
         return []
     
-    def generate_answer(self, query: str, contexts: List[str]) -> str:
-        """Generate dual answers and select the best one"""
-        local_answer = "Local model unavailable"
-        groq_answer = "Groq unavailable"
-        
-        # Get answer from local MCP server
-        if self._mcp_connected:
-            try:
-                result = self._call_mcp_tool_sync("generate_answer", {
-                    "query": query,
-                    "contexts": contexts
-                })
-                local_answer = result or "Local model failed"
-                logger.info(f"Local answer: {local_answer[:100]}...")
-            except Exception as e:
-                logger.error(f"Local answer generation failed: {e}")
-                local_answer = f"Local error: {str(e)}"
-        
-        # Get answer from Groq
-        if self._groq_connected:
-            groq_answer = self._generate_groq_answer(query, contexts)
-            logger.info(f"Groq answer: {groq_answer[:100]}...")
-        
-        # If only one source available, return it
-        if not self._mcp_connected and self._groq_connected:
-            return groq_answer
-        elif self._mcp_connected and not self._groq_connected:
+    async def _generate_local_answer_async(self, query: str, contexts: List[str]) -> str:
+        """Get answer from local MCP server"""
+        try:
+            result = await self._call_mcp_tool_async("generate_answer", {
+                "query": query,
+                "contexts": contexts
+            })
+            local_answer = result or "Local model failed"
+            logger.info(f"Local answer: {local_answer[:100]}...")
             return local_answer
-        elif not self._mcp_connected and not self._groq_connected:
+        except Exception as e:
+            logger.error(f"Local answer generation failed: {e}")
+            return f"Local error: {str(e)}"
+
+    async def _generate_answer_async(self, query: str, contexts: List[str]) -> str:
+        """Generate the local and Groq answers, then select the best one"""
+        loop = asyncio.get_running_loop()
+        # Built once per query and shared by every Groq prompt below
+        context_text = _context_text(contexts)
+
+        groq_available = self._groq_available()
+        if not self._mcp_connected and not groq_available:
             return "Both AI sources unavailable"
-        
-        # Both available - let Groq decide which is better
-        best_answer, reason = self._compare_answers_with_groq(query, local_answer, groq_answer)
+
+        if not groq_available:
+            return await self._generate_local_answer_async(query, contexts)
+
+        if not self._mcp_connected:
+            # Groq SDK is blocking - keep it off the event loop
+            return await loop.run_in_executor(self._groq_pool, self._generate_groq_answer, query, context_text)
+
+        if self._speculative_groq:
+            return await self._generate_answer_speculative(query, contexts, context_text)
+
+        local_answer = await self._generate_local_answer_async(query, contexts)
+        if not self._local_answer_usable(local_answer):
+            # Nothing to judge against - plain single-call Groq answer
+            return await loop.run_in_executor(self._groq_pool, self._generate_groq_answer, query, context_text)
+
+        # Both available - one Groq call answers and judges against the local answer
+        best_answer, reason = await loop.run_in_executor(
+            self._groq_pool, self._generate_and_judge_with_groq, query, context_text, local_answer
+        )
         logger.info(f"Selected answer: {reason}")
-        
+
         return best_answer
-    
+
+    async def _generate_answer_speculative(self, query: str, contexts: List[str], context_text: str) -> str:
+        """Start Groq immediately and only wait for it when the local answer is not convincing"""
+        loop = asyncio.get_running_loop()
+        groq_cancel = threading.Event()
+        groq_future = loop.run_in_executor(self._groq_pool, self._generate_groq_answer, query, context_text, groq_cancel)
+
+        started = time.perf_counter()
+        local_answer = await self._generate_local_answer_async(query, contexts)
+        local_seconds = time.perf_counter() - started
+
+        if self._local_answer_confident(local_answer, local_seconds):
+            # Stop the streaming Groq decode and discard its result
+            groq_cancel.set()
+            groq_future.cancel()
+            logger.info(f"Selected answer: local (confident in {local_seconds:.2f}s, Groq skipped)")
+            return local_answer
+
+        try:
+            groq_answer = await groq_future
+        except Exception as e:
+            logger.error(f"Groq answer generation failed: {e}")
+            groq_answer = f"Groq error: {e}"
+        logger.info(f"Groq answer: {groq_answer[:100]}...")
+
+        if not self._local_answer_usable(local_answer):
+            return groq_answer
+        if groq_answer.startswith(("Groq error", "Groq not available")):
+            return local_answer
+
+        best_answer, reason = await loop.run_in_executor(
+            self._groq_pool, self._compare_answers_with_groq, query, local_answer, groq_answer
+        )
+        logger.info(f"Selected answer: {reason}")
+
+        return best_answer
+
+    @staticmethod
+    def _local_answer_usable(answer: str) -> bool:
+        return bool(answer) and not answer.startswith(("Local error:", "Local model failed"))
+
+    def _local_answer_confident(self, answer: str, elapsed_seconds: float) -> bool:
+        """Cheap confidence check used to decide whether the speculative Groq answer is needed"""
+        if not self._local_answer_usable(answer) or elapsed_seconds > self._speculative_max_local_seconds:
+            return False
+        answer_lower = answer.lower()
+        if any(phrase in answer_lower for phrase in ("could not find", "cannot determine", "error", "unable to")):
+            return False
+        return len(answer.split()) >= self._speculative_min_words
+
+    def generate_answer(self, query: str, contexts: List[str]) -> str:
+        """Generate dual answers and select the best one"""
+        key = self._cache_key("generate_answer", query, *contexts)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        if self._loop is None or not self._loop.is_running():
+            # No background loop (local MCP unavailable) - run the same pipeline inline
+            answer = asyncio.run(self._generate_answer_async(query, contexts))
+        else:
+            future = asyncio.run_coroutine_threadsafe(
+                self._generate_answer_async(query, contexts),
+                self._loop
+            )
+            try:
+                answer = future.result(timeout=90)
+            except concurrent.futures.TimeoutError:
+                future.cancel()
+                logger.error("Dual answer generation timeout")
+                return "Answer generation timed out"
+
+        if self._answer_cacheable(answer):
+            self._cache_put(key, answer)
+        return answer
+
+    @staticmethod
+    def _answer_cacheable(answer: str) -> bool:
+        return bool(answer) and not answer.startswith(
+            ("Local error", "Local model failed", "Groq error", "Groq not available", "Both AI sources")
+        )
+
     def rerank_results(self, query: str, candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Rerank results via local MCP"""
         if self._mcp_connected:
@@ -369,19 +927,26 @@ Format: "Winner: [A/B] - [explanation]"
                     "query": query,
                     "candidates": candidates
                 })
-                return json.loads(result) if result else candidates
+                return _json_loads(result) if result else candidates
             except:
                 pass
         return candidates
     
     def summarize_text(self, text: str, max_length: int = 160) -> str:
         """Summarize text via local MCP"""
+        key = self._cache_key("summarize_text", str(max_length), text)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+
         if self._mcp_connected:
             try:
                 result = self._call_mcp_tool_sync("summarize_text", {
                     "text": text,
                     "max_length": max_length
                 })
+                if result:
+                    self._cache_put(key, result)
                 return result or text[:max_length] + "..."
             except:
                 pass
@@ -393,13 +958,14 @@ Format: "Winner: [A/B] - [explanation]"
             "provider": "Dual (Local + Groq)",
             "local_mcp_connected": self._mcp_connected,
             "groq_connected": self._groq_connected,
+            "groq_circuit_open": self._groq_connected and not self._groq_available(),
             "strategy": "dual_answer_with_groq_selection"
         }
         
         if self._mcp_connected:
             try:
                 local_info = self._call_mcp_tool_sync("get_model_info", {})
-                info["local_models"] = json.loads(local_info) if local_info else {}
+                info["local_models"] = _json_loads(local_info) if local_info else {}
             except:
                 info["local_models"] = "unavailable"
         
@@ -414,15 +980,19 @@ Format: "Winner: [A/B] - [explanation]"
     def clear_cache(self) -> Dict[str, str]:
         """Clear cache on both sources"""
         results = {}
+
+        with self._result_cache_lock:
+            self._result_cache.clear()
         
         if self._mcp_connected:
             try:
                 result = self._call_mcp_tool_sync("clear_cache", {})
-                results["local"] = json.loads(result) if result else {"message": "cleared"}
+                results["local"] = _json_loads(result) if result else {"message": "cleared"}
             except:
                 results["local"] = {"message": "failed"}
         
         results["groq"] = {"message": "no cache to clear"}
+        results["client"] = {"message": "result cache cleared"}
         
         return {"message": "Cache cleared on available sources", "details": results}
 
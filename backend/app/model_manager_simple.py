@@ -3,9 +3,11 @@ Simplified Model Manager - GROQ-focused approach
 Improved local quality with extractive answer generation and hybrid reranking.
 """
 
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Sequence
 import re
-from collections import Counter
+from collections import OrderedDict
+
+import numpy as np
 
 from .logger import logger
 import threading
@@ -13,6 +15,12 @@ import time
 from .config import settings as cfg
 
 # Simplified imports - only what we absolutely need
+try:
+    import torch
+    TORCH_AVAILABLE = True
+except ImportError:
+    TORCH_AVAILABLE = False
+
 try:
     from sentence_transformers import SentenceTransformer
     SENTENCE_TRANSFORMERS_AVAILABLE = True
@@ -21,6 +29,33 @@ except ImportError as e:
     logger.warning(f"Sentence transformers not available: {e}")
     SENTENCE_TRANSFORMERS_AVAILABLE = False
 
+# Optional: serve the embedder through ONNX Runtime (int8) instead of eager PyTorch
+from .onnx_embedder import ONNX_INT8_AVAILABLE, load_int8_embedder
+
+# Token characters kept by _tokenize; everything else except whitespace is stripped in one pass
+_NON_TOKEN_RE = re.compile(r"[^a-z0-9%\-\s]+")
+_DIGIT_RE = re.compile(r"\d")
+_DATE_RE = re.compile(r"\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b|\b\d{1,2}\s+[A-Za-z]+\s+\d{4}\b")
+_NON_WORD_RE = re.compile(r"\W+")
+_WORD_RE = re.compile(r"[a-z]+")
+# Sentence boundaries (whitespace after terminal punctuation); the extractive path also breaks on newlines
+_SENT_RE = re.compile(r"(?<=[.!?])\s+")
+_SENT_OR_LINE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+_GRADE_KEYWORDS = frozenset({
+    "score", "scores", "mark", "marks", "grade", "grades", "percentage", "percentages",
+})
+
+def _sentence_spans(text: str):
+    """Yield (start, end) offsets of the sentences _SENT_RE.split would produce"""
+    start = 0
+    for m in _SENT_RE.finditer(text):
+        yield start, m.start()
+        start = m.end()
+    yield start, len(text)
+
+# Shared placeholder embedding for the failure path; immutable so every row can reference it
+_ZERO_VEC = (0.0,) * 384
+
 # Simple fallback for text generation
 class SimpleTextGenerator:
     """Simple fallback text generator"""
@@ -29,7 +64,7 @@ class SimpleTextGenerator:
     
     def __call__(self, prompt, **kwargs):
         # Simple rule-based response for key queries
-        if any(word in prompt.lower() for word in ['score', 'mark', 'grade', 'percentage']):
+        if not _GRADE_KEYWORDS.isdisjoint(_WORD_RE.findall(prompt.lower())):
             return "Based on the document context, please refer to the specific scores and grades mentioned in the uploaded document."
         return "Please refer to the GROQ AI response for detailed analysis."
 
@@ -57,10 +92,16 @@ class SimplifiedModelManager:
         self._models = {}
         self._loading_lock = threading.Lock()
         self._device = "cpu"  # Keep it simple
+        # Bounded LRU of text -> float32 embedding row; repeated queries/chunks skip the encoder
+        self._embedding_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._embedding_cache_lock = threading.Lock()
+        self._max_embedding_cache_size = 10000
         
         logger.info("Simplified ModelManager initialized - GROQ-focused approach")
         logger.info("Hugging Face authentication disabled - using public models only")
         logger.info(f"ModelManager initialized with device: {self._device}")
+        if TORCH_AVAILABLE:
+            torch.set_num_threads(max(1, cfg.intellidoc_torch_threads))
         
         # Preload only critical models
         self._preload_critical_models()
@@ -75,10 +116,14 @@ class SimplifiedModelManager:
                 logger.info(f"Loading embedding model: {cfg.embedding_model}")
                 start_time = time.time()
                 
-                self._models['embeddings'] = SentenceTransformer(
-                    cfg.embedding_model,
-                    device=self._device
-                )
+                embedder = None
+                if cfg.embedding_int8_cpu and ONNX_INT8_AVAILABLE:
+                    embedder = load_int8_embedder(cfg.embedding_model)
+                if embedder is None:
+                    embedder = SentenceTransformer(cfg.embedding_model, device=self._device)
+                    if TORCH_AVAILABLE and cfg.embedding_int8_cpu:
+                        self._quantize_embedder(embedder)
+                self._models['embeddings'] = embedder
                 
                 load_time = time.time() - start_time
                 logger.info(f"Embedding model loaded in {load_time:.2f}s")
@@ -94,34 +139,81 @@ class SimplifiedModelManager:
         
         logger.info("Critical models loaded")
 
-    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Get embeddings for texts"""
+    def _cached_embeddings(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        with self._embedding_cache_lock:
+            rows = []
+            for text in texts:
+                row = self._embedding_cache.get(text)
+                if row is not None:
+                    self._embedding_cache.move_to_end(text)
+                rows.append(row)
+            return rows
+
+    def _store_embeddings(self, texts: List[str], rows: np.ndarray):
+        with self._embedding_cache_lock:
+            for text, row in zip(texts, rows):
+                # Copy so the cache does not pin the whole batch array
+                self._embedding_cache[text] = np.array(row, dtype=np.float32)
+                self._embedding_cache.move_to_end(text)
+            while len(self._embedding_cache) > self._max_embedding_cache_size:
+                self._embedding_cache.popitem(last=False)
+
+    @staticmethod
+    def _quantize_embedder(embedder):
+        """Swap the encoder's Linear layers for dynamic int8 versions (CPU only)"""
+        try:
+            module = embedder._first_module()
+            module.auto_model = torch.quantization.quantize_dynamic(
+                module.auto_model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+            logger.info("Embedding model quantized to int8 for CPU inference")
+        except Exception as e:
+            logger.warning(f"int8 quantization failed, keeping FP32 embedder: {e}")
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        embedder = self._models['embeddings']
+        kwargs = dict(batch_size=32, normalize_embeddings=True, convert_to_numpy=True, show_progress_bar=False)
+        if TORCH_AVAILABLE:
+            with torch.inference_mode():
+                return embedder.encode(texts, **kwargs)
+        return embedder.encode(texts, **kwargs)
+
+    def get_embeddings(self, texts: List[str]) -> List[Sequence[float]]:
+        """Get embeddings for texts; failure rows all share the read-only _ZERO_VEC"""
         if self._models.get('embeddings') is None:
             logger.error("No embedding model available")
             # Return dummy embeddings
-            return [[0.0] * 384 for _ in texts]
+            return [_ZERO_VEC] * len(texts)
         
         try:
-            embeddings = self._models['embeddings'].encode(texts, normalize_embeddings=True)
-            return embeddings.tolist()
+            rows = self._cached_embeddings(texts)
+            # Encode only the misses (deduplicated) in a single call, then fill in original order
+            missed = list(dict.fromkeys(text for text, row in zip(texts, rows) if row is None))
+            if missed:
+                encoded = self._encode(missed)
+                self._store_embeddings(missed, encoded)
+                by_text = dict(zip(missed, encoded))
+                rows = [row if row is not None else by_text[text] for text, row in zip(texts, rows)]
+            # Callers take Python lists; convert each cached/encoded row directly, no staging copy
+            return [row.tolist() for row in rows]
         except Exception as e:
             logger.error(f"Embedding generation failed: {e}")
-            return [[0.0] * 384 for _ in texts]
+            return [_ZERO_VEC] * len(texts)
     
     def generate_embedding(self, text: str) -> List[float]:
         """Generate single embedding - for compatibility"""
         if self._models.get('embeddings') is None:
             logger.error("No embedding model available")
-            return [0.0] * 384
+            return list(_ZERO_VEC)
         
         try:
-            embedding = self._models['embeddings'].encode([text], normalize_embeddings=True)
-            return embedding[0].tolist()
+            row = self.get_embeddings([text])[0]
+            return list(row) if row is _ZERO_VEC else row
         except Exception as e:
             logger.error(f"Embedding generation failed: {e}")
-            return [0.0] * 384
+            return list(_ZERO_VEC)
     
-    def generate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
+    def generate_embeddings_batch(self, texts: List[str]) -> List[Sequence[float]]:
         """Generate embeddings batch - alias for get_embeddings for compatibility"""
         return self.get_embeddings(texts)
 
@@ -155,23 +247,18 @@ class SimplifiedModelManager:
         
         try:
             # Simple text summarization - extract key sentences
-            sentences = text.split('.')
-            sentences = [s.strip() for s in sentences if len(s.strip()) > 20]
+            # One streaming pass keeps only (start, end) offsets of sentences long enough to use
+            spans = [
+                (start, end) for start, end in _sentence_spans(text)
+                if len(text[start:end].strip().rstrip('.')) > 20
+            ]
             
-            if len(sentences) <= 3:
+            if len(spans) <= 3:
                 return text[:500] + "..." if len(text) > 500 else text
             
             # Take first sentence, middle sentence, and last sentence
-            summary_sentences = []
-            if sentences:
-                summary_sentences.append(sentences[0])
-                if len(sentences) > 2:
-                    mid_idx = len(sentences) // 2
-                    summary_sentences.append(sentences[mid_idx])
-                if len(sentences) > 1:
-                    summary_sentences.append(sentences[-1])
-            
-            summary = '. '.join(summary_sentences) + '.'
+            picks = (spans[0], spans[len(spans) // 2], spans[-1])
+            summary = '. '.join(text[start:end].strip().rstrip('.') for start, end in picks) + '.'
             
             # Ensure reasonable length
             if len(summary) > 1000:
@@ -204,22 +291,22 @@ class SimplifiedModelManager:
             query_text = query.lower().strip()
             wants_numeric = self._is_numeric_query(query_text)
 
+            scores = []
             for candidate in packed_candidates:
                 text = str(candidate.get("text", ""))
                 text_lower = text.lower()
-                lexical = self._lexical_relevance(expanded_terms, text)
+                # Tokenize each candidate once from its lowercased text and score with C-level set ops
+                lexical = self._lexical_relevance_tokens(expanded_terms, self._tokenize_lower(text_lower))
                 semantic = float(candidate.get("score", 0.0))
                 phrase_boost = 0.2 if query_text and query_text in text_lower else 0.0
-                numeric_boost = 0.1 if wants_numeric and re.search(r"\d", text) else 0.0
+                numeric_boost = 0.1 if wants_numeric and _DIGIT_RE.search(text) else 0.0
 
                 hybrid_score = (semantic * 0.65) + (lexical * 0.35) + phrase_boost + numeric_boost
                 candidate["rerank_score"] = float(hybrid_score)
+                scores.append(candidate["rerank_score"])
 
-            reranked = sorted(
-                packed_candidates,
-                key=lambda c: c.get("rerank_score", c.get("score", 0.0)),
-                reverse=True,
-            )
+            order = sorted(range(len(packed_candidates)), key=scores.__getitem__, reverse=True)
+            reranked = [packed_candidates[i] for i in order]
             logger.info(f"Reranked {len(candidates)} candidates with hybrid scoring")
 
             if input_is_string_list:
@@ -231,16 +318,15 @@ class SimplifiedModelManager:
             return candidates
 
     def _normalize_token(self, token: str) -> str:
-        return re.sub(r"[^a-z0-9%\-]", "", token.lower())
+        return _NON_TOKEN_RE.sub("", token.lower())
+
+    def _tokenize_lower(self, text_lower: str) -> List[str]:
+        """Tokenize already-lowercased text; same result as normalizing each whitespace-split token"""
+        stop_words = self._STOP_WORDS
+        return [t for t in _NON_TOKEN_RE.sub("", text_lower).split() if len(t) > 1 and t not in stop_words]
 
     def _tokenize(self, text: str) -> List[str]:
-        raw = re.split(r"\s+", text.lower())
-        out: List[str] = []
-        for t in raw:
-            n = self._normalize_token(t)
-            if len(n) > 1 and n not in self._STOP_WORDS:
-                out.append(n)
-        return out
+        return self._tokenize_lower(text.lower())
 
     def _expanded_query_terms(self, query: str) -> set:
         terms = set(self._tokenize(query))
@@ -253,13 +339,15 @@ class SimplifiedModelManager:
     def _lexical_relevance(self, query_terms: set, text: str) -> float:
         if not query_terms:
             return 0.0
-        tokens = self._tokenize(text)
-        if not tokens:
+        return self._lexical_relevance_tokens(query_terms, self._tokenize(text))
+
+    def _lexical_relevance_tokens(self, query_terms: set, tokens: List[str]) -> float:
+        if not query_terms or not tokens:
             return 0.0
-        token_counts = Counter(tokens)
-        overlap = query_terms.intersection(set(tokens))
+        overlap = query_terms.intersection(tokens)
         coverage = len(overlap) / max(1, len(query_terms))
-        freq_score = sum(token_counts.get(t, 0) for t in overlap) / max(1, len(tokens))
+        # Occurrences of overlapping terms == tokens that are query terms; no Counter needed
+        freq_score = sum(1 for t in tokens if t in overlap) / len(tokens)
         return (coverage * 0.75) + (freq_score * 0.25)
 
     def _is_numeric_query(self, query: str) -> bool:
@@ -269,8 +357,8 @@ class SimplifiedModelManager:
         return any(k in query for k in ["date", "deadline", "when", "schedule", "last date", "exam date"])
 
     def _split_sentences(self, text: str) -> List[str]:
-        parts = re.split(r"(?<=[.!?])\s+|\n+", text)
-        return [p.strip() for p in parts if len(p.strip()) >= 25]
+        stripped = (p.strip() for p in _SENT_OR_LINE_RE.split(text))
+        return [p for p in stripped if len(p) >= 25]
 
     def _extractive_answer(self, query: str, contexts: List[str]) -> str:
         query_lower = query.lower().strip()
@@ -282,10 +370,11 @@ class SimplifiedModelManager:
         for cidx, ctx in enumerate(contexts[:8]):
             for sidx, sentence in enumerate(self._split_sentences(ctx)):
                 sent_lower = sentence.lower()
-                lexical = self._lexical_relevance(query_terms, sentence)
+                # Tokenize the already-lowercased sentence rather than lowering it again
+                lexical = self._lexical_relevance_tokens(query_terms, self._tokenize_lower(sent_lower)) if query_terms else 0.0
                 phrase_boost = 0.2 if query_lower and query_lower in sent_lower else 0.0
-                numeric_boost = 0.12 if wants_numeric and re.search(r"\d", sentence) else 0.0
-                date_boost = 0.12 if wants_date and re.search(r"\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b|\b\d{1,2}\s+[A-Za-z]+\s+\d{4}\b", sentence) else 0.0
+                numeric_boost = 0.12 if wants_numeric and _DIGIT_RE.search(sentence) else 0.0
+                date_boost = 0.12 if wants_date and _DATE_RE.search(sentence) else 0.0
                 length_penalty = 0.05 if len(sentence.split()) > 60 else 0.0
                 score = lexical + phrase_boost + numeric_boost + date_boost - length_penalty
 
@@ -309,7 +398,7 @@ class SimplifiedModelManager:
         dedup = []
         seen = set()
         for row in top_sorted:
-            key = re.sub(r"\W+", "", row["text"].lower())
+            key = _NON_WORD_RE.sub("", row["text"].lower())
             if key and key not in seen:
                 seen.add(key)
                 dedup.append(row["text"])
@@ -333,7 +422,8 @@ class SimplifiedModelManager:
 
     def clear_cache(self):
         """Clear model cache"""
-        # Simple implementation
+        with self._embedding_cache_lock:
+            self._embedding_cache.clear()
         logger.info("Model cache cleared")
 
 # Create global instance
@@ -1,7 +1,59 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Float, DateTime, Index, Text, JSON
+from sqlalchemy import Column, Integer, String, ForeignKey, Float, DateTime, Index, Text, JSON, LargeBinary
+from sqlalchemy import DDL, event
 from sqlalchemy.orm import relationship
+from sqlalchemy.types import TypeDecorator
 from datetime import datetime
+import json
+import numpy as np
 from .db import Base
+from .config import settings
+
+try:
+    from pgvector.sqlalchemy import Vector
+    PGVECTOR_AVAILABLE = True
+except ImportError:
+    Vector = None
+    PGVECTOR_AVAILABLE = False
+
+
+def uses_pgvector(dialect) -> bool:
+    """Whether chunk embeddings live in a pgvector column for this dialect"""
+    return settings.use_pgvector and PGVECTOR_AVAILABLE and dialect.name == "postgresql"
+
+
+class EmbeddingVector(TypeDecorator):
+    """float32 vector column, always read back as a numpy array. Stored as JSON by default
+    (the original schema), as raw little-endian bytes with settings.packed_embeddings
+    (1536 bytes for 384 dims), or as a pgvector ``vector`` when enabled on PostgreSQL."""
+    impl = JSON
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if uses_pgvector(dialect):
+            return dialect.type_descriptor(Vector(settings.embedding_dim))
+        if settings.packed_embeddings:
+            return dialect.type_descriptor(LargeBinary())
+        return dialect.type_descriptor(JSON())
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        vec = np.asarray(value, dtype="<f4")
+        if uses_pgvector(dialect):
+            return vec
+        if settings.packed_embeddings:
+            return vec.tobytes()
+        return vec.tolist()
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return np.frombuffer(value, dtype="<f4")
+        if isinstance(value, str):  # legacy JSON text
+            value = json.loads(value)
+        return np.asarray(value, dtype=np.float32)
+
 
 class Document(Base):
     __tablename__ = "documents"
@@ -26,17 +78,44 @@ class Chunk(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     text = Column(Text)
-    # Store embeddings as JSON for SQLite compatibility
-    embedding = Column(JSON)
+    # Decoded into a numpy array; packed float32 bytes skip the JSON round trip (see EmbeddingVector)
+    embedding = Column(EmbeddingVector)
     doc_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"))
 
     document = relationship("Document", back_populates="chunks")
+
+    def set_embedding(self, vec):
+        self.embedding = np.asarray(vec, dtype=np.float32)
+
+    def get_embedding(self) -> np.ndarray:
+        if self.embedding is None:
+            return np.zeros(0, dtype=np.float32)
+        return np.asarray(self.embedding, dtype=np.float32)
     
     __table_args__ = (
-        Index('ix_chunk_doc_id', 'doc_id'),
+        # (doc_id, id) serves both the doc filter and the id ordering of per-document searches
+        Index('ix_chunk_doc_id_id', 'doc_id', 'id'),
     )
 
 
+def _pgvector_ddl(ddl, target, bind, **kw):
+    return uses_pgvector(bind.dialect)
+
+
+# pgvector needs its extension before the table exists; HNSW keeps cosine top-k sublinear
+event.listen(
+    Chunk.__table__, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS vector").execute_if(callable_=_pgvector_ddl),
+)
+event.listen(
+    Chunk.__table__, "after_create",
+    DDL(
+        "CREATE INDEX IF NOT EXISTS ix_chunk_embedding_hnsw ON chunks "
+        "USING hnsw (embedding vector_cosine_ops)"
+    ).execute_if(callable_=_pgvector_ddl),
+)
+
+
 class User(Base):
     __tablename__ = 'users'
 
@@ -0,0 +1,62 @@
+"""
+int8 ONNX Runtime embedder shared by ModelManager and SimplifiedModelManager
+"""
+import os
+import shutil
+import tempfile
+from typing import Optional
+
+from .logger import logger
+
+# Optional: ONNX Runtime int8 embedder for CPU inference
+try:
+    import optimum.onnxruntime  # noqa: F401
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+    ONNX_INT8_AVAILABLE = True
+except ImportError:
+    ONNX_INT8_AVAILABLE = False
+
+INT8_EMBEDDER_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "intellidoc", "embedder-int8")
+INT8_EMBEDDER_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+
+
+def _export_int8_embedder(model_name: str, save_dir: str):
+    """Export into a private temp dir and rename it into place, so a concurrent process never sees a partial export"""
+    parent = os.path.dirname(save_dir)
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".export-", dir=parent)
+    try:
+        logger.info(f"Exporting int8 ONNX embedder to {save_dir}")
+        onnx_model = SentenceTransformer(model_name, device="cpu", backend="onnx")
+        onnx_model.save(tmp_dir)
+        export_dynamic_quantized_onnx_model(onnx_model, "avx512_vnni", tmp_dir)
+        try:
+            os.replace(tmp_dir, save_dir)
+        except OSError:
+            # Another process finished its export first; keep theirs
+            if not os.path.exists(os.path.join(save_dir, INT8_EMBEDDER_FILE)):
+                raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def load_int8_embedder(model_name: str) -> Optional["SentenceTransformer"]:
+    """Load (exporting on first use) a dynamically int8-quantized ONNX copy of the embedder, or None"""
+    if not ONNX_INT8_AVAILABLE:
+        return None
+    save_dir = os.path.join(INT8_EMBEDDER_CACHE_DIR, model_name.replace("/", "--"))
+    try:
+        if not os.path.exists(os.path.join(save_dir, INT8_EMBEDDER_FILE)):
+            _export_int8_embedder(model_name, save_dir)
+
+        embedder = SentenceTransformer(
+            save_dir,
+            device="cpu",
+            backend="onnx",
+            model_kwargs={"file_name": INT8_EMBEDDER_FILE, "provider": "CPUExecutionProvider"}
+        )
+        logger.info("Loaded int8 ONNX Runtime embedding model")
+        return embedder
+    except Exception as e:
+        logger.warning(f"int8 ONNX embedder unavailable, using PyTorch weights: {e}")
+        return None
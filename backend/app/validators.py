@@ -1,4 +1,5 @@
 import os
+import string
 from fastapi import HTTPException, UploadFile
 from .config import settings
 from .logger import logger
@@ -11,6 +12,14 @@ except ImportError:
     MAGIC_AVAILABLE = False
     magic = None
 
+# Settings are read once at import; normalize the allowed extensions to a frozenset up front
+_ALLOWED_EXTS = frozenset(
+    settings.allowed_extensions
+    if isinstance(settings.allowed_extensions, (list, set, tuple, frozenset))
+    else [settings.allowed_extensions]
+)
+_ALLOWED_EXTS_TEXT = ", ".join(sorted(_ALLOWED_EXTS))
+
 def validate_file(file: UploadFile) -> None:
     """Validate uploaded file for security and format compliance"""
 
@@ -20,45 +29,79 @@ def validate_file(file: UploadFile) -> None:
     # NOTE: Some ASGI servers don't populate file.size; leave size check to server limits
     ext = os.path.splitext(file.filename)[1].lower()
 
-    allowed = (
-        settings.allowed_extensions
-        if isinstance(settings.allowed_extensions, (list, set, tuple))
-        else [settings.allowed_extensions]
-    )
-    if ext not in allowed:
+    if ext not in _ALLOWED_EXTS:
         logger.warning(f"Unsupported file type: {file.filename} ({ext})")
         raise HTTPException(
             status_code=400,
-            detail=f"Unsupported file type: {ext}. Allowed: {', '.join(allowed)}"
+            detail=f"Unsupported file type: {ext}. Allowed: {_ALLOWED_EXTS_TEXT}"
         )
 
     logger.info(f"File validation passed: {file.filename}")
 
+# ASCII characters kept in stored filenames; everything else is deleted by one str.translate
+_FILENAME_ALLOWED = frozenset(string.ascii_letters + string.digits + "._-")
+_FILENAME_TRANS = str.maketrans("", "", "".join(chr(c) for c in range(128) if chr(c) not in _FILENAME_ALLOWED))
+
 def get_safe_filename(filename: str) -> str:
     """Generate safe filename to prevent directory traversal"""
     # Remove path components and dangerous characters
     safe_name = os.path.basename(filename)
-    safe_name = "".join(c for c in safe_name if c.isalnum() or c in "._-")
+    if safe_name.isascii():
+        safe_name = safe_name.translate(_FILENAME_TRANS)
+    else:
+        # Non-ASCII names keep unicode letters/digits, which the ASCII table can't express
+        safe_name = "".join(c for c in safe_name if c.isalnum() or c in "._-")
 
     if not safe_name:
         safe_name = "uploaded_file"
     return safe_name
 
+# Leading bytes of the binary formats we accept; enough to classify without libmagic
+_FILE_SIGNATURES = (
+    (b"%PDF", "application/pdf"),
+    (b"PK\x03\x04", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+    (b"\xD0\xCF\x11\xE0\xA1\xB1\x1A\xE1", "application/msword"),
+)
+_EXTENSION_MIME_TYPES = {
+    '.pdf': 'application/pdf',
+    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    '.doc': 'application/msword',
+    '.txt': 'text/plain'
+}
+
+def _looks_like_text(head: bytes) -> bool:
+    """UTF-8 without NUL bytes; a multi-byte character cut off by the sample still counts"""
+    if b"\x00" in head:
+        return False
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        return e.reason == "unexpected end of data" and e.start >= len(head) - 3
+    return True
+
 def detect_file_type(file_path: str) -> str:
-    """Detect actual file type using python-magic or fallback to extension-based detection"""
-    if MAGIC_AVAILABLE:
-        try:
-            mime_type = magic.from_file(file_path, mime=True)
+    """Detect actual file type from its header bytes, falling back to the extension"""
+    try:
+        with open(file_path, "rb") as f:
+            head = f.read(1024)
+    except OSError as e:
+        logger.warning(f"Could not read {file_path} for type detection: {e}")
+        head = b""
+
+    for signature, mime_type in _FILE_SIGNATURES:
+        if head.startswith(signature):
             return mime_type
+
+    # Full libmagic scan is opt-in; it walks a multi-megabyte database per call
+    if settings.deep_magic and MAGIC_AVAILABLE:
+        try:
+            return magic.from_file(file_path, mime=True)
         except Exception as e:
             logger.warning(f"Could not detect file type for {file_path}: {e}")
 
+    if head and _looks_like_text(head):
+        return "text/plain"
+
     # Fallback to extension-based detection
     ext = os.path.splitext(file_path)[1].lower()
-    mime_types = {
-        '.pdf': 'application/pdf',
-        '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-        '.doc': 'application/msword',
-        '.txt': 'text/plain'
-    }
-    return mime_types.get(ext, "application/octet-stream")
+    return _EXTENSION_MIME_TYPES.get(ext, "application/octet-stream")
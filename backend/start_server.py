@@ -1,11 +1,16 @@
 #!/usr/bin/env python3
 """
 Startup script for AI Document Tool with optimized configuration
+
+Runs uvicorn on uvloop with the httptools HTTP parser when both are installed
+(falling back to asyncio / h11 otherwise). UVICORN_RELOAD=false disables the
+dev reloader; UVICORN_WORKERS then sets the worker count (each worker loads its
+own models, so it defaults to one).
 """
+import importlib.util
 import os
 import sys
 import warnings
-import subprocess
 
 # Suppress warnings before importing anything
 warnings.filterwarnings("ignore", category=FutureWarning)
@@ -28,27 +33,24 @@ def main():
     backend_dir = os.path.dirname(os.path.abspath(__file__))
     os.chdir(backend_dir)
     
-    # Start uvicorn server with suppressed warnings
-    cmd = [
-        sys.executable, "-m", "uvicorn", 
-        "app.main:app",
-        "--host", "0.0.0.0",
-        "--port", "8000",
-        "--reload"
-    ]
+    # Run uvicorn in this interpreter; it already handles SIGINT/SIGTERM itself
+    import uvicorn
+    
+    options = {"host": "0.0.0.0", "port": 8000, "app_dir": backend_dir}
+    # uvloop/httptools cut per-request event-loop and parsing overhead; keep uvicorn's defaults without them
+    if importlib.util.find_spec("uvloop") is not None:
+        options["loop"] = "uvloop"
+    if importlib.util.find_spec("httptools") is not None:
+        options["http"] = "httptools"
+    # Reload runs its own supervisor process; production deployments turn it off and scale with workers
+    if os.environ.get("UVICORN_RELOAD", "true").lower() in ("true", "1", "yes"):
+        options["reload"] = True
+    elif os.environ.get("UVICORN_WORKERS"):
+        options["workers"] = int(os.environ["UVICORN_WORKERS"])
     
     try:
-        # Redirect stderr to suppress C++ level warnings (optional)
-        with open(os.devnull, 'w') as devnull:
-            process = subprocess.Popen(
-                cmd,
-                # stderr=devnull,  # Uncomment this line to completely suppress stderr
-                env=os.environ
-            )
-            process.wait()
-    except KeyboardInterrupt:
-        print("\n🛑 Server stopped by user")
-        process.terminate()
+        # Import string rather than the app object: reload and workers both re-import it in child processes
+        uvicorn.run("app.main:app", **options)
     except Exception as e:
         print(f"❌ Error starting server: {e}")
         sys.exit(1)
@@ -10,10 +10,13 @@ sys.path.append('.')
 def test_cuda_fallback():
     """Test CUDA error handling and CPU fallback"""
     print("=== Testing CUDA Error Handling and CPU Fallback ===\n")
+    # Reported before the heavy import so a forced-CPU run is visible immediately
+    print(f"FORCE_CPU: {os.environ.get('FORCE_CPU', 'false')}")
     
     try:
-        from app.model_manager import model_manager
+        from app.model_manager import model_manager, _HAS_CUDA
         
+        print(f"CUDA available: {_HAS_CUDA}")
         print(f"Device detected: {model_manager._device}")
         print("Testing normal operation...")
         
@@ -5,14 +5,34 @@ Uses Groq API for fast, reliable AI inference
 """
 
 import asyncio
+import hashlib
 import json
 import sys
 import os
+import time
 from typing import Any, Dict, List, Optional
+from collections import OrderedDict
 import logging
 import numpy as np
 from datetime import datetime
 
+# orjson serializes tool payloads (ndarrays included) without building Python float lists
+try:
+    import orjson
+
+    def dumps(value) -> str:
+        return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+except ImportError:
+    orjson = None
+
+    def _json_default(value):
+        if isinstance(value, (np.ndarray, np.generic)):
+            return value.tolist()
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+    def dumps(value) -> str:
+        return json.dumps(value, default=_json_default)
+
 # MCP imports
 from mcp.server import Server
 from mcp.server.models import InitializationOptions
@@ -35,8 +55,29 @@ except ImportError:
     print("Please install groq: pip install groq")
     sys.exit(1)
 
+# Optional: pooled HTTP/2 transport for the Groq SDK
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Optional: exact token counts for prompt budgeting (falls back to a ~4 chars/token estimate)
+try:
+    import tiktoken
+    tokenizer = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    tokenizer = None
+
+# Shared int8 ONNX loader from the backend package (exports once into the user cache, atomically)
+sys.path.append(os.path.join(os.path.dirname(__file__), '../backend'))
+try:
+    from app.onnx_embedder import load_int8_embedder
+except ImportError:
+    load_int8_embedder = None
+
 # Simple embedding using sentence transformers (lightweight model)
 try:
+    import torch
     from sentence_transformers import SentenceTransformer
 except ImportError:
     SentenceTransformer = None
@@ -46,19 +87,92 @@ app = Server("ai-doc-tool-groq")
 
 # Global variables
 groq_client = None
+http_client = None
 embedding_model = None
-cache = {}
+# LRU of completed Groq answers keyed by a digest of (model, contexts, query)
+RESPONSE_CACHE_SIZE = int(os.getenv("GROQ_MCP_RESPONSE_CACHE_SIZE", "512"))
+cache: "OrderedDict[bytes, str]" = OrderedDict()
+
+# Sent byte-for-byte identical as the leading message of every answer request, so Groq's
+# prompt prefix cache can reuse its prefill; per-request context and question follow it
+ANSWER_MODEL = "llama-3.1-70b-versatile"
+ANSWER_SYSTEM_PROMPT = """You are an expert AI assistant that provides comprehensive, accurate answers based on the given context.
+
+Instructions:
+- Answer based ONLY on the provided context
+- Be thorough and provide detailed explanations
+- If you cannot find information in the context, say so clearly
+- Provide specific details and examples when available
+- Write in a clear, professional manner
+- Give at least 2-3 sentences with complete explanations"""
+
+# Prompt token budgets: contexts past the budget are dropped rather than paid for in prefill
+ANSWER_MAX_CONTEXTS = 5
+ANSWER_CONTEXT_TOKENS = int(os.getenv("GROQ_MCP_CONTEXT_TOKENS", "3000"))
+SUMMARY_INPUT_TOKENS = int(os.getenv("GROQ_MCP_SUMMARY_TOKENS", "500"))
+
+# Concurrent generate_embedding calls are coalesced into one encode() per window
+EMBED_MAX_BATCH = int(os.getenv("GROQ_MCP_EMBED_MAX_BATCH", "32"))
+EMBED_MAX_WAIT = float(os.getenv("GROQ_MCP_EMBED_MAX_WAIT_MS", "5")) / 1000.0
+embed_queue: Optional[asyncio.Queue] = None
+embed_worker: Optional[asyncio.Task] = None
+
+# generate_embeddings_batch sizes each encode() so it finishes within a per-chunk deadline,
+# using an EMA of observed per-text encode time
+EMBED_BATCH_DEADLINE = float(os.getenv("GROQ_MCP_EMBED_DEADLINE_MS", "100")) / 1000.0
+EMBED_BATCH_LIMIT = 64
+EMBED_EMA_ALPHA = 0.2
+embed_seconds_per_text = 0.005
+
+# LRU of blake2b(text) -> float16 embedding row; only touched from the event loop, so no lock
+EMBED_CACHE_SIZE = int(os.getenv("GROQ_MCP_EMBED_CACHE_SIZE", "50000"))
+embedding_cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
 
 def init_groq_client():
     """Initialize Groq client"""
-    global groq_client
+    global groq_client, http_client
     api_key = os.getenv("GROQ_API_KEY")
     if not api_key:
         raise Exception("GROQ_API_KEY environment variable not set")
     
-    groq_client = Groq(api_key=api_key)
+    http_client = create_http_client()
+    if http_client is not None:
+        groq_client = Groq(api_key=api_key, http_client=http_client)
+    else:
+        groq_client = Groq(api_key=api_key)
     print("✅ Groq client initialized")
 
+def create_http_client():
+    """Pooled keep-alive client shared by all Groq calls (HTTP/2 when h2 is installed)"""
+    if httpx is None:
+        return None
+    limits = httpx.Limits(max_keepalive_connections=50, max_connections=100)
+    try:
+        return httpx.Client(http2=True, limits=limits, timeout=30)
+    except ImportError:
+        # HTTP/2 needs the optional 'h2' package; keep-alive over HTTP/1.1 still avoids re-handshakes
+        return httpx.Client(limits=limits, timeout=30)
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+def load_int8_embedding_model(name: str):
+    """int8 embedder: ONNX Runtime build when available, else dynamically quantized PyTorch Linears"""
+    model = load_int8_embedder(name) if load_int8_embedder is not None else None
+    if model is not None:
+        print("✅ Using int8 ONNX Runtime embedding model")
+        return model
+    print("⚠️ int8 ONNX embedder unavailable, quantizing PyTorch weights")
+
+    model = SentenceTransformer(name, device="cpu")
+    try:
+        module = model._first_module()
+        module.auto_model = torch.quantization.quantize_dynamic(
+            module.auto_model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    except Exception as e:
+        print(f"⚠️ int8 quantization failed, keeping FP32 embedder: {e}")
+    return model
+
 def init_embedding_model():
     """Initialize lightweight embedding model"""
     global embedding_model
@@ -67,149 +181,343 @@ def init_embedding_model():
         return
     
     try:
-        # Use a small, fast embedding model
-        embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        # Use a small, fast embedding model, int8-quantized for CPU unless disabled
+        if os.getenv("GROQ_MCP_EMBED_INT8", "true").lower() in ("true", "1", "yes"):
+            embedding_model = load_int8_embedding_model(EMBEDDING_MODEL_NAME)
+        else:
+            embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
         print("✅ Embedding model initialized")
     except Exception as e:
         print(f"⚠️ Could not load embedding model: {e}")
         embedding_model = None
 
-def simple_text_embedding(text: str, dim: int = 384) -> List[float]:
-    """Simple hash-based embedding fallback"""
-    import hashlib
-    hash_obj = hashlib.md5(text.encode())
-    hash_hex = hash_obj.hexdigest()
-    
-    # Convert hex to numbers and normalize
-    numbers = [int(hash_hex[i:i+2], 16) for i in range(0, len(hash_hex), 2)]
-    
-    # Pad or truncate to desired dimension
-    while len(numbers) < dim:
-        numbers.extend(numbers[:dim-len(numbers)])
-    numbers = numbers[:dim]
-    
-    # Normalize to unit vector
-    norm = np.linalg.norm(numbers)
+def encode_texts(texts, **kwargs):
+    """Run the embedding model without autograd bookkeeping"""
+    with torch.inference_mode():
+        return embedding_model.encode(texts, normalize_embeddings=True, **kwargs)
+
+def response_cache_key(*parts: str) -> bytes:
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.digest()
+
+def cached_response(key: bytes) -> Optional[str]:
+    response = cache.get(key)
+    if response is not None:
+        cache.move_to_end(key)
+    return response
+
+def cache_response(key: bytes, response: str):
+    cache[key] = response
+    cache.move_to_end(key)
+    if len(cache) > RESPONSE_CACHE_SIZE:
+        cache.popitem(last=False)
+
+def embedding_cache_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+def cache_embedding(key: bytes, row: np.ndarray) -> np.ndarray:
+    """Store a row as float16 (half the memory) and return the stored copy"""
+    row = np.asarray(row, dtype=np.float16)
+    embedding_cache[key] = row
+    embedding_cache.move_to_end(key)
+    if len(embedding_cache) > EMBED_CACHE_SIZE:
+        embedding_cache.popitem(last=False)
+    return row
+
+def cached_embedding(key: bytes) -> Optional[np.ndarray]:
+    row = embedding_cache.get(key)
+    if row is not None:
+        embedding_cache.move_to_end(key)
+    return row
+
+async def encode_adaptive(texts: List[str], deadline: float = EMBED_BATCH_DEADLINE) -> np.ndarray:
+    """Encode texts in deadline-sized chunks, yielding to the event loop between them"""
+    global embed_seconds_per_text
+    chunks = []
+    start = 0
+    while start < len(texts):
+        batch_size = int(min(max(deadline // embed_seconds_per_text, 1), EMBED_BATCH_LIMIT))
+        batch = texts[start:start + batch_size]
+        began = time.perf_counter()
+        chunks.append(await asyncio.to_thread(encode_texts, batch, batch_size=len(batch)))
+        per_text = (time.perf_counter() - began) / len(batch)
+        embed_seconds_per_text += EMBED_EMA_ALPHA * (per_text - embed_seconds_per_text)
+        start += len(batch)
+    return np.concatenate(chunks)
+
+async def embed_text(text: str) -> np.ndarray:
+    """Queue one text for the batching worker and wait for its embedding row"""
+    global embed_queue, embed_worker
+    if embed_worker is None or embed_worker.done():
+        embed_queue = asyncio.Queue()
+        embed_worker = asyncio.create_task(embedding_batch_worker())
+    reply = asyncio.get_running_loop().create_future()
+    embed_queue.put_nowait((text, reply))
+    return await reply
+
+async def embedding_batch_worker():
+    """Drain up to EMBED_MAX_BATCH queued texts (waiting at most EMBED_MAX_WAIT) per encode() call"""
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await embed_queue.get()]
+        deadline = loop.time() + EMBED_MAX_WAIT
+        while len(batch) < EMBED_MAX_BATCH:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(embed_queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+
+        pending = [(text, reply) for text, reply in batch if not reply.done()]
+        if not pending:
+            continue
+
+        # Identical texts in one window share a single row
+        unique_texts = list(dict.fromkeys(text for text, _ in pending))
+        try:
+            rows = await asyncio.to_thread(encode_texts, unique_texts, batch_size=len(unique_texts))
+            by_text = dict(zip(unique_texts, rows))
+            for text, reply in pending:
+                if not reply.done():
+                    reply.set_result(by_text[text])
+        except Exception as e:
+            for _, reply in pending:
+                if not reply.done():
+                    reply.set_exception(e)
+
+async def send_stream_progress(ctx, token, progress: int, delta: str):
+    try:
+        await ctx.session.send_progress_notification(token, progress, message=delta)
+    except TypeError:
+        # Older mcp releases have no progress message field; progress counts still flow
+        await ctx.session.send_progress_notification(token, progress)
+
+async def groq_chat(stream: bool = False, **kwargs) -> str:
+    """Run a Groq chat completion off the event loop. With stream=True and a progress token
+    on the request, each content delta is forwarded as an MCP progress notification."""
+    ctx = app.request_context if stream else None
+    token = ctx.meta.progressToken if ctx is not None and ctx.meta is not None else None
+    if token is None:
+        completion = await asyncio.to_thread(groq_client.chat.completions.create, stream=False, **kwargs)
+        return completion.choices[0].message.content.strip()
+
+    loop = asyncio.get_running_loop()
+    deltas: asyncio.Queue = asyncio.Queue()
+
+    def produce():
+        try:
+            for chunk in groq_client.chat.completions.create(stream=True, **kwargs):
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    loop.call_soon_threadsafe(deltas.put_nowait, delta)
+        except Exception as e:
+            loop.call_soon_threadsafe(deltas.put_nowait, e)
+            return
+        loop.call_soon_threadsafe(deltas.put_nowait, None)
+
+    producer = loop.run_in_executor(None, produce)
+    parts = []
+    while True:
+        item = await deltas.get()
+        if item is None:
+            break
+        if isinstance(item, Exception):
+            raise item
+        parts.append(item)
+        await send_stream_progress(ctx, token, len(parts), item)
+    await producer
+    return "".join(parts).strip()
+
+def budget_contexts(contexts: List[str], budget: int = ANSWER_CONTEXT_TOKENS) -> str:
+    """Join the top contexts in order, stopping at the first one that would overflow the token budget"""
+    contexts = contexts[:ANSWER_MAX_CONTEXTS]
+    if tokenizer is None:
+        counts = [len(context) // 4 + 1 for context in contexts]
+    else:
+        # encode_ordinary_batch tokenizes the contexts on parallel threads
+        counts = [len(ids) for ids in tokenizer.encode_ordinary_batch(contexts)]
+    kept = []
+    used = 0
+    for context, count in zip(contexts, counts):
+        if used + count > budget:
+            if not kept:
+                kept.append(truncate_tokens(context, budget))
+            break
+        kept.append(context)
+        used += count + 1  # "\n\n" separator
+    return "\n\n".join(kept)
+
+def truncate_tokens(text: str, budget: int) -> str:
+    """Cut text to at most budget tokens, marking the cut with an ellipsis"""
+    if tokenizer is None:
+        return text if len(text) <= budget * 4 else text[:budget * 4] + "..."
+    ids = tokenizer.encode_ordinary(text)
+    return text if len(ids) <= budget else tokenizer.decode(ids[:budget]) + "..."
+
+# Reranking is skipped when the candidate list is this short or already clearly ordered
+RERANK_MIN_CANDIDATES = 4
+RERANK_SCORE_MARGIN = 0.2
+
+def sort_by_score(candidates: list) -> list:
+    """Candidates ordered by their retrieval score (stable, descending)"""
+    return sorted(candidates, key=lambda c: c.get("score", 0), reverse=True)
+
+async def embedding_rerank(query: str, candidates: list) -> list:
+    """Order candidates by query similarity from the local embedding model, or by score without it"""
+    if embedding_model is None:
+        return sort_by_score(candidates)
+    texts = [query] + [c["text"] for c in candidates]
+    vectors = await asyncio.to_thread(encode_texts, texts, batch_size=16)
+    similarity = vectors[1:] @ vectors[0]
+    return [candidates[i] for i in np.argsort(-similarity, kind="stable")]
+
+def simple_text_embedding(text: str, dim: int = 384) -> np.ndarray:
+    """Simple hash-based embedding fallback: digest bytes tiled to dim and unit-normalized"""
+    # BLAKE2b's widest digest (64 bytes) gives 4x the distinct components of MD5 for the same hashing cost
+    digest = hashlib.blake2b(text.encode(), digest_size=64).digest()
+    vec = np.resize(np.frombuffer(digest, dtype=np.uint8).astype(np.float32), dim)
+    norm = np.linalg.norm(vec)
     if norm > 0:
-        numbers = [x / norm for x in numbers]
-    
-    return numbers
+        vec /= norm
+    return vec
 
-@app.list_tools()
-async def list_tools() -> list[Tool]:
-    """List available AI tools"""
-    return [
-        Tool(
-            name="generate_embedding",
-            description="Generate normalized embedding for text using fast embedding model",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "text": {
-                        "type": "string",
-                        "description": "Text to generate embedding for"
-                    }
+# Tool definitions never change; build them once instead of on every list_tools request
+TOOLS = [
+    Tool(
+        name="generate_embedding",
+        description="Generate normalized embedding for text using fast embedding model",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "text": {
+                    "type": "string",
+                    "description": "Text to generate embedding for"
+                }
+            },
+            "required": ["text"]
+        }
+    ),
+    Tool(
+        name="generate_embeddings_batch",
+        description="Generate embeddings for multiple texts efficiently",
+        inputSchema={
+            "type": "object", 
+            "properties": {
+                "texts": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "List of texts to generate embeddings for"
                 },
-                "required": ["text"]
-            }
-        ),
-        Tool(
-            name="generate_embeddings_batch",
-            description="Generate embeddings for multiple texts efficiently",
-            inputSchema={
-                "type": "object", 
-                "properties": {
-                    "texts": {
-                        "type": "array",
-                        "items": {"type": "string"},
-                        "description": "List of texts to generate embeddings for"
-                    }
+                "deadline_ms": {
+                    "type": "number",
+                    "description": "Latency budget per encode batch; batch size adapts to fit it"
+                }
+            },
+            "required": ["texts"]
+        }
+    ),
+    Tool(
+        name="generate_answer",
+        description="Generate comprehensive answer using Groq API",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "User's question"
                 },
-                "required": ["texts"]
-            }
-        ),
-        Tool(
-            name="generate_answer",
-            description="Generate comprehensive answer using Groq API",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "query": {
-                        "type": "string",
-                        "description": "User's question"
-                    },
-                    "contexts": {
-                        "type": "array",
-                        "items": {"type": "string"},
-                        "description": "List of relevant context texts"
-                    }
+                "contexts": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "List of relevant context texts"
                 },
-                "required": ["query", "contexts"]
-            }
-        ),
-        Tool(
-            name="rerank_results",
-            description="Rerank search results using Groq API",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "query": {
-                        "type": "string",
-                        "description": "Search query"
-                    },
-                    "candidates": {
-                        "type": "array",
-                        "items": {
-                            "type": "object",
-                            "properties": {
-                                "text": {"type": "string"},
-                                "score": {"type": "number"},
-                                "doc_id": {"type": "integer"},
-                                "doc_title": {"type": "string"}
-                            }
-                        },
-                        "description": "List of search result candidates"
-                    }
+                "stream": {
+                    "type": "boolean",
+                    "description": "Send answer tokens as progress notifications while generating",
+                    "default": False
+                }
+            },
+            "required": ["query", "contexts"]
+        }
+    ),
+    Tool(
+        name="rerank_results",
+        description="Rerank search results using Groq API",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "Search query"
                 },
-                "required": ["query", "candidates"]
-            }
-        ),
-        Tool(
-            name="summarize_text",
-            description="Generate summary using Groq API",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "text": {
-                        "type": "string",
-                        "description": "Text to summarize"
+                "candidates": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "text": {"type": "string"},
+                            "score": {"type": "number"},
+                            "doc_id": {"type": "integer"},
+                            "doc_title": {"type": "string"}
+                        }
                     },
-                    "max_length": {
-                        "type": "integer",
-                        "description": "Maximum summary length",
-                        "default": 160
-                    }
+                    "description": "List of search result candidates"
+                }
+            },
+            "required": ["query", "candidates"]
+        }
+    ),
+    Tool(
+        name="summarize_text",
+        description="Generate summary using Groq API",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "text": {
+                    "type": "string",
+                    "description": "Text to summarize"
                 },
-                "required": ["text"]
-            }
-        ),
-        Tool(
-            name="get_model_info",
-            description="Get information about Groq models",
-            inputSchema={
-                "type": "object",
-                "properties": {}
-            }
-        ),
-        Tool(
-            name="clear_cache",
-            description="Clear response cache",
-            inputSchema={
-                "type": "object",
-                "properties": {}
-            }
-        )
-    ]
+                "max_length": {
+                    "type": "integer",
+                    "description": "Maximum summary length",
+                    "default": 160
+                },
+                "stream": {
+                    "type": "boolean",
+                    "description": "Send summary tokens as progress notifications while generating",
+                    "default": False
+                }
+            },
+            "required": ["text"]
+        }
+    ),
+    Tool(
+        name="get_model_info",
+        description="Get information about Groq models",
+        inputSchema={
+            "type": "object",
+            "properties": {}
+        }
+    ),
+    Tool(
+        name="clear_cache",
+        description="Clear response cache",
+        inputSchema={
+            "type": "object",
+            "properties": {}
+        }
+    )
+]
+
+@app.list_tools()
+async def list_tools() -> list[Tool]:
+    """List available AI tools"""
+    return TOOLS
 
 @app.call_tool()
 async def call_tool(name: str, arguments: dict) -> list[TextContent]:
@@ -221,38 +529,48 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
             text = arguments["text"]
             
             if embedding_model:
-                embedding = embedding_model.encode(text, normalize_embeddings=True).tolist()
+                key = embedding_cache_key(text)
+                row = cached_embedding(key)
+                if row is None:
+                    row = cache_embedding(key, await embed_text(text))
+                embedding = row  # float16, serialized as-is
             else:
                 embedding = simple_text_embedding(text)
             
-            return [TextContent(type="text", text=json.dumps(embedding))]
+            return [TextContent(type="text", text=dumps(embedding))]
         
         elif name == "generate_embeddings_batch":
             texts = arguments["texts"]
             
             if embedding_model:
-                embeddings = embedding_model.encode(texts, normalize_embeddings=True, batch_size=16).tolist()
+                keys = [embedding_cache_key(text) for text in texts]
+                rows = [cached_embedding(key) for key in keys]
+                # Encode only the (deduplicated) misses, off the event loop, then merge in order
+                missed = list(dict.fromkeys(key for key, row in zip(keys, rows) if row is None))
+                if missed:
+                    text_by_key = dict(zip(keys, texts))
+                    deadline = arguments.get("deadline_ms")
+                    deadline = deadline / 1000.0 if deadline else EMBED_BATCH_DEADLINE
+                    encoded = await encode_adaptive([text_by_key[key] for key in missed], deadline)
+                    fresh = {key: cache_embedding(key, row) for key, row in zip(missed, encoded)}
+                    rows = [row if row is not None else fresh[key] for key, row in zip(keys, rows)]
+                embeddings = np.stack(rows) if rows else []  # (N, D) float16
             else:
-                embeddings = [simple_text_embedding(text) for text in texts]
+                embeddings = np.stack([simple_text_embedding(text) for text in texts]) if texts else []
             
-            return [TextContent(type="text", text=json.dumps(embeddings))]
+            return [TextContent(type="text", text=dumps(embeddings))]
         
         elif name == "generate_answer":
             query = arguments["query"]
             contexts = arguments["contexts"]
             
-            # Prepare context for Groq
-            context_text = "\n\n".join(contexts[:5])  # Use top 5 contexts
+            # Prepare context for Groq: top contexts that fit the token budget
+            context_text = budget_contexts(contexts)
             
-            system_prompt = """You are an expert AI assistant that provides comprehensive, accurate answers based on the given context. 
-            
-            Instructions:
-            - Answer based ONLY on the provided context
-            - Be thorough and provide detailed explanations
-            - If you cannot find information in the context, say so clearly
-            - Provide specific details and examples when available
-            - Write in a clear, professional manner
-            - Give at least 2-3 sentences with complete explanations"""
+            key = response_cache_key("generate_answer", ANSWER_MODEL, context_text, query)
+            answer = cached_response(key)
+            if answer is not None:
+                return [TextContent(type="text", text=answer)]
             
             user_prompt = f"""Context:
 {context_text}
@@ -261,19 +579,19 @@ Question: {query}
 
 Please provide a comprehensive answer based on the context above."""
 
-            completion = groq_client.chat.completions.create(
-                model="llama-3.1-70b-versatile",  # Fast and accurate
+            answer = await groq_chat(
+                stream=bool(arguments.get("stream", False)),
+                model=ANSWER_MODEL,  # Fast and accurate
                 messages=[
-                    {"role": "system", "content": system_prompt},
+                    {"role": "system", "content": ANSWER_SYSTEM_PROMPT},
                     {"role": "user", "content": user_prompt}
                 ],
                 temperature=0.1,
                 max_tokens=500,
-                top_p=0.9,
-                stream=False
+                top_p=0.9
             )
-            
-            answer = completion.choices[0].message.content.strip()
+            if answer:
+                cache_response(key, answer)
             return [TextContent(type="text", text=answer)]
         
         elif name == "rerank_results":
@@ -281,7 +599,14 @@ Please provide a comprehensive answer based on the context above."""
             candidates = arguments["candidates"]
             
             if not candidates:
-                return [TextContent(type="text", text=json.dumps([]))]
+                return [TextContent(type="text", text=dumps([]))]
+            
+            # An LLM round-trip can't pay for itself on a short or already well-separated list
+            ordered = sort_by_score(candidates)
+            if len(ordered) < RERANK_MIN_CANDIDATES or (
+                ordered[0].get("score", 0) - ordered[1].get("score", 0) > RERANK_SCORE_MARGIN
+            ):
+                return [TextContent(type="text", text=dumps(ordered))]
             
             # Use Groq to score relevance (simplified reranking)
             rerank_prompt = f"""Rate the relevance of each text to the query on a scale of 0-100.
@@ -290,47 +615,47 @@ Query: {query}
 Texts:
 """
             for i, candidate in enumerate(candidates[:10]):  # Limit to 10 for speed
-                rerank_prompt += f"{i+1}. {candidate['text'][:200]}...\n"
+                rerank_prompt += f"{i+1}. {candidate['text'][:120]}...\n"
             
             rerank_prompt += "\nReturn only a JSON array of scores [score1, score2, ...] with no other text."
             
             try:
-                completion = groq_client.chat.completions.create(
+                scores_text = await groq_chat(
                     model="llama-3.1-8b-instant",  # Faster model for reranking
                     messages=[
                         {"role": "user", "content": rerank_prompt}
                     ],
                     temperature=0,
-                    max_tokens=100,
-                    stream=False
+                    max_tokens=100
                 )
-                
-                scores_text = completion.choices[0].message.content.strip()
-                scores = json.loads(scores_text)
-                
-                # Apply new scores
-                for i, candidate in enumerate(candidates[:len(scores)]):
-                    candidate["rerank_score"] = scores[i]
-                
-                # Sort by rerank score
-                reranked = sorted(candidates, key=lambda x: x.get("rerank_score", x.get("score", 0)), reverse=True)
-                
+                scores = np.asarray(json.loads(scores_text), dtype=np.float32).ravel()[:len(candidates)]
+            except ValueError as e:
+                print(f"Unparseable rerank scores: {e}, ranking by embedding similarity")
+                reranked = await embedding_rerank(query, candidates)
             except Exception as e:
                 print(f"Reranking failed: {e}, using original order")
                 reranked = candidates
+            else:
+                # Apply new scores; candidates the model didn't score keep their existing score
+                for candidate, score in zip(candidates, scores.tolist()):
+                    candidate["rerank_score"] = score
+                tail = [c.get("rerank_score", c.get("score", 0)) for c in candidates[len(scores):]]
+                keys = np.concatenate([scores, np.asarray(tail, dtype=np.float32)])
+                
+                # Sort by rerank score (stable, descending)
+                reranked = [candidates[i] for i in np.argsort(-keys, kind="stable")]
             
-            return [TextContent(type="text", text=json.dumps(reranked))]
+            return [TextContent(type="text", text=dumps(reranked))]
         
         elif name == "summarize_text":
             text = arguments["text"]
             max_length = arguments.get("max_length", 160)
             
             # Truncate if text is too long
-            max_input = 2000
-            if len(text) > max_input:
-                text = text[:max_input] + "..."
+            text = truncate_tokens(text, SUMMARY_INPUT_TOKENS)
             
-            completion = groq_client.chat.completions.create(
+            summary = await groq_chat(
+                stream=bool(arguments.get("stream", False)),
                 model="llama-3.1-8b-instant",
                 messages=[
                     {
@@ -339,28 +664,27 @@ Texts:
                     }
                 ],
                 temperature=0.1,
-                max_tokens=100,
-                stream=False
+                max_tokens=100
             )
-            
-            summary = completion.choices[0].message.content.strip()
             return [TextContent(type="text", text=summary)]
         
         elif name == "get_model_info":
             info = {
                 "provider": "Groq",
-                "text_model": "llama-3.1-70b-versatile",
-                "embedding_model": "all-MiniLM-L6-v2" if embedding_model else "simple-hash",
+                "text_model": ANSWER_MODEL,
+                "embedding_model": EMBEDDING_MODEL_NAME if embedding_model else "simple-hash",
                 "device": "cloud",
                 "status": "connected",
                 "timestamp": datetime.utcnow().isoformat(),
-                "cache_size": len(cache)
+                "cache_size": len(cache),
+                "embedding_cache_size": len(embedding_cache)
             }
-            return [TextContent(type="text", text=json.dumps(info))]
+            return [TextContent(type="text", text=dumps(info))]
         
         elif name == "clear_cache":
             cache.clear()
-            return [TextContent(type="text", text=json.dumps({"message": "Cache cleared successfully"}))]
+            embedding_cache.clear()
+            return [TextContent(type="text", text=dumps({"message": "Cache cleared successfully"}))]
         
         else:
             raise McpError(ErrorCode.METHOD_NOT_FOUND, f"Unknown tool: {name}")
@@ -385,20 +709,72 @@ async def main():
         print(f"❌ Failed to initialize services: {e}")
         sys.exit(1)
     
-    # Run the server
-    async with stdio_server() as (read_stream, write_stream):
-        await app.run(
-            read_stream, 
-            write_stream, 
-            InitializationOptions(
-                server_name="ai-doc-tool-groq",
-                server_version="1.0.0",
-                capabilities=app.get_capabilities(
-                    notification_options=None,
-                    experimental_capabilities=None
-                )
-            )
+    initialization_options = InitializationOptions(
+        server_name="ai-doc-tool-groq",
+        server_version="1.0.0",
+        capabilities=app.get_capabilities(
+            notification_options=None,
+            experimental_capabilities=None
+        )
+    )
+    
+    # Run the server; MCP_TRANSPORT matches the backend client's setting
+    transport = os.getenv("MCP_TRANSPORT", "stdio").lower()
+    try:
+        if transport in ("http", "sse"):
+            await serve_http(transport, initialization_options)
+        else:
+            async with stdio_server() as (read_stream, write_stream):
+                await app.run(read_stream, write_stream, initialization_options)
+    finally:
+        if http_client is not None:
+            http_client.close()
+
+async def serve_http(transport: str, initialization_options: InitializationOptions):
+    """Serve MCP over streamable HTTP (/mcp) or SSE (/sse) instead of newline-framed stdio"""
+    import uvicorn
+    from starlette.applications import Starlette
+    from starlette.responses import Response
+    from starlette.routing import Mount, Route
+    
+    if transport == "sse":
+        from mcp.server.sse import SseServerTransport
+        
+        sse = SseServerTransport("/messages/")
+        
+        async def handle_sse(request):
+            async with sse.connect_sse(request.scope, request.receive, request._send) as (read_stream, write_stream):
+                await app.run(read_stream, write_stream, initialization_options)
+            return Response()
+        
+        http_app = Starlette(routes=[
+            Route("/sse", endpoint=handle_sse, methods=["GET"]),
+            Mount("/messages/", app=sse.handle_post_message),
+        ])
+    else:
+        from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+        
+        session_manager = StreamableHTTPSessionManager(app=app)
+        
+        async def handle_mcp(scope, receive, send):
+            await session_manager.handle_request(scope, receive, send)
+        
+        http_app = Starlette(
+            routes=[Mount("/mcp", app=handle_mcp)],
+            lifespan=lambda _: session_manager.run(),
         )
+    
+    # Own port so it can run alongside the local-model server (MCP_SERVER_PORT, 8765)
+    host = os.getenv("GROQ_MCP_SERVER_HOST", "127.0.0.1")
+    port = int(os.getenv("GROQ_MCP_SERVER_PORT", "8766"))
+    print(f"🌐 Serving MCP over {transport} on http://{host}:{port}")
+    await uvicorn.Server(uvicorn.Config(http_app, host=host, port=port, log_level="warning")).serve()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    # uvloop speeds up the socket transports; stdio gains little but loses nothing
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+    asyncio.run(main())
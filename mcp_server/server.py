@@ -5,11 +5,32 @@ Handles local AI models: embeddings, text generation, reranking
 """
 
 import asyncio
+import base64
 import json
+import struct
 import sys
 import os
 from typing import Any, Dict, List, Optional
 
+import numpy as np
+
+# orjson serializes tool payloads (ndarrays included) without building Python float lists
+try:
+    import orjson
+
+    def dumps(value) -> str:
+        return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+except ImportError:
+    orjson = None
+
+    def _json_default(value):
+        if isinstance(value, (np.ndarray, np.generic)):
+            return value.tolist()
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+    def dumps(value) -> str:
+        return json.dumps(value, default=_json_default)
+
 # MCP imports
 from mcp.server import Server
 from mcp.server.models import InitializationOptions
@@ -31,121 +52,139 @@ from app.logger import logger
 # Initialize MCP Server for Local Models
 app = Server("local-ai-models")
 
-@app.list_tools()
-async def list_tools() -> list[Tool]:
-    """List available AI tools"""
-    return [
-        Tool(
-            name="generate_embedding",
-            description="Generate normalized embedding for text",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "text": {
-                        "type": "string",
-                        "description": "Text to generate embedding for"
-                    }
+# Tool definitions never change; build them once instead of on every list_tools request
+TOOLS = [
+    Tool(
+        name="generate_embedding",
+        description="Generate normalized embedding for text",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "text": {
+                    "type": "string",
+                    "description": "Text to generate embedding for"
+                }
+            },
+            "required": ["text"]
+        }
+    ),
+    Tool(
+        name="generate_embeddings_batch",
+        description="Generate embeddings for multiple texts efficiently",
+        inputSchema={
+            "type": "object", 
+            "properties": {
+                "texts": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "List of texts to generate embeddings for"
+                }
+            },
+            "required": ["texts"]
+        }
+    ),
+    Tool(
+        name="generate_embeddings_batch_bin",
+        description="Generate embeddings for multiple texts as base64 float32 (header: rows, dim as little-endian uint32)",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "texts": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "List of texts to generate embeddings for"
+                }
+            },
+            "required": ["texts"]
+        }
+    ),
+    Tool(
+        name="generate_answer",
+        description="Generate comprehensive answer from query and contexts",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "User's question"
                 },
-                "required": ["text"]
-            }
-        ),
-        Tool(
-            name="generate_embeddings_batch",
-            description="Generate embeddings for multiple texts efficiently",
-            inputSchema={
-                "type": "object", 
-                "properties": {
-                    "texts": {
-                        "type": "array",
-                        "items": {"type": "string"},
-                        "description": "List of texts to generate embeddings for"
-                    }
+                "contexts": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "List of relevant context texts"
+                }
+            },
+            "required": ["query", "contexts"]
+        }
+    ),
+    Tool(
+        name="rerank_results",
+        description="Rerank search results using cross-encoder",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "Search query"
                 },
-                "required": ["texts"]
-            }
-        ),
-        Tool(
-            name="generate_answer",
-            description="Generate comprehensive answer from query and contexts",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "query": {
-                        "type": "string",
-                        "description": "User's question"
+                "candidates": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "text": {"type": "string"},
+                            "score": {"type": "number"},
+                            "doc_id": {"type": "integer"},
+                            "doc_title": {"type": "string"}
+                        }
                     },
-                    "contexts": {
-                        "type": "array",
-                        "items": {"type": "string"},
-                        "description": "List of relevant context texts"
-                    }
+                    "description": "List of search result candidates"
+                }
+            },
+            "required": ["query", "candidates"]
+        }
+    ),
+    Tool(
+        name="summarize_text",
+        description="Generate summary of text",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "text": {
+                    "type": "string",
+                    "description": "Text to summarize"
                 },
-                "required": ["query", "contexts"]
-            }
-        ),
-        Tool(
-            name="rerank_results",
-            description="Rerank search results using cross-encoder",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "query": {
-                        "type": "string",
-                        "description": "Search query"
-                    },
-                    "candidates": {
-                        "type": "array",
-                        "items": {
-                            "type": "object",
-                            "properties": {
-                                "text": {"type": "string"},
-                                "score": {"type": "number"},
-                                "doc_id": {"type": "integer"},
-                                "doc_title": {"type": "string"}
-                            }
-                        },
-                        "description": "List of search result candidates"
-                    }
-                },
-                "required": ["query", "candidates"]
-            }
-        ),
-        Tool(
-            name="summarize_text",
-            description="Generate summary of text",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "text": {
-                        "type": "string",
-                        "description": "Text to summarize"
-                    },
-                    "max_length": {
-                        "type": "integer",
-                        "description": "Maximum summary length",
-                        "default": 160
-                    }
-                },
-                "required": ["text"]
-            }
-        ),
-        Tool(
-            name="get_model_info",
-            description="Get information about loaded models",
-            inputSchema={
-                "type": "object",
-                "properties": {}
-            }
-        ),
-        Tool(
-            name="clear_cache",
-            description="Clear model and embedding caches",
-            inputSchema={
-                "type": "object",
-                "properties": {}
-            }
-        )
-    ]
+                "max_length": {
+                    "type": "integer",
+                    "description": "Maximum summary length",
+                    "default": 160
+                }
+            },
+            "required": ["text"]
+        }
+    ),
+    Tool(
+        name="get_model_info",
+        description="Get information about loaded models",
+        inputSchema={
+            "type": "object",
+            "properties": {}
+        }
+    ),
+    Tool(
+        name="clear_cache",
+        description="Clear model and embedding caches",
+        inputSchema={
+            "type": "object",
+            "properties": {}
+        }
+    )
+]
+
+@app.list_tools()
+async def list_tools() -> list[Tool]:
+    """List available AI tools"""
+    return TOOLS
 
 @app.call_tool()
 async def call_tool(name: str, arguments: dict) -> list[TextContent]:
@@ -155,13 +194,21 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
         
         if name == "generate_embedding":
             text = arguments["text"]
-            embedding = model_manager.generate_embedding(text)
-            return [TextContent(type="text", text=json.dumps(embedding))]
+            embedding = await model_manager.generate_embedding_async(text)
+            return [TextContent(type="text", text=dumps(embedding))]
         
         elif name == "generate_embeddings_batch":
             texts = arguments["texts"]
             embeddings = model_manager.generate_embeddings_batch(texts)
-            return [TextContent(type="text", text=json.dumps(embeddings))]
+            return [TextContent(type="text", text=dumps(embeddings))]
+        
+        elif name == "generate_embeddings_batch_bin":
+            texts = arguments["texts"]
+            embeddings = np.asarray(model_manager.generate_embeddings_batch(texts), dtype="<f4")
+            rows = embeddings.shape[0]
+            dim = embeddings.shape[1] if embeddings.ndim == 2 else 0
+            payload = struct.pack("<II", rows, dim) + embeddings.tobytes()
+            return [TextContent(type="text", text=base64.b64encode(payload).decode("ascii"))]
         
         elif name == "generate_answer":
             query = arguments["query"]
@@ -173,7 +220,7 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
             query = arguments["query"]
             candidates = arguments["candidates"]
             reranked = model_manager.rerank_results(query, candidates)
-            return [TextContent(type="text", text=json.dumps(reranked))]
+            return [TextContent(type="text", text=dumps(reranked))]
         
         elif name == "summarize_text":
             text = arguments["text"]
@@ -185,11 +232,11 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
             model_info = model_manager.get_model_info()
             cache_stats = cache_manager.get_cache_stats()
             info = {**model_info, "cache_stats": cache_stats}
-            return [TextContent(type="text", text=json.dumps(info))]
+            return [TextContent(type="text", text=dumps(info))]
         
         elif name == "clear_cache":
             model_manager.clear_cache()
-            return [TextContent(type="text", text=json.dumps({"message": "Cache cleared successfully"}))]
+            return [TextContent(type="text", text=dumps({"message": "Cache cleared successfully"}))]
         
         else:
             raise McpError(ErrorCode.METHOD_NOT_FOUND, f"Unknown tool: {name}")
@@ -202,28 +249,65 @@ async def main():
     """Run the MCP server"""
     logger.info("Starting MCP AI Server...")
     
-    # Initialize models on startup
-    try:
-        logger.info("Initializing AI models...")
-        model_info = model_manager.get_model_info()
-        logger.info(f"Models initialized: {model_info}")
-    except Exception as e:
-        logger.error(f"Failed to initialize models: {e}")
+    initialization_options = InitializationOptions(
+        server_name="ai-doc-tool",
+        server_version="1.0.0",
+        capabilities=app.get_capabilities(
+            notification_options=None,
+            experimental_capabilities=None
+        )
+    )
     
-    # Run the server
+    # Models preload in the background when model_manager is imported; the client keeps
+    # this process (and its loaded models) for its whole lifetime, pinging it between calls
+    transport = os.getenv("MCP_TRANSPORT", "stdio").lower()
+    if transport in ("http", "sse"):
+        await serve_http(transport, initialization_options)
+        return
+    
+    logger.info("MCP AI Server ready on stdio")
     async with stdio_server() as (read_stream, write_stream):
-        await app.run(
-            read_stream, 
-            write_stream, 
-            InitializationOptions(
-                server_name="ai-doc-tool",
-                server_version="1.0.0",
-                capabilities=app.get_capabilities(
-                    notification_options=None,
-                    experimental_capabilities=None
-                )
-            )
+        await app.run(read_stream, write_stream, initialization_options)
+
+async def serve_http(transport: str, initialization_options: InitializationOptions):
+    """Serve MCP over streamable HTTP (/mcp) or SSE (/sse) for a client started with the same MCP_TRANSPORT"""
+    import uvicorn
+    from starlette.applications import Starlette
+    from starlette.responses import Response
+    from starlette.routing import Mount, Route
+    
+    if transport == "sse":
+        from mcp.server.sse import SseServerTransport
+        
+        sse = SseServerTransport("/messages/")
+        
+        async def handle_sse(request):
+            async with sse.connect_sse(request.scope, request.receive, request._send) as (read_stream, write_stream):
+                await app.run(read_stream, write_stream, initialization_options)
+            return Response()
+        
+        http_app = Starlette(routes=[
+            Route("/sse", endpoint=handle_sse, methods=["GET"]),
+            Mount("/messages/", app=sse.handle_post_message),
+        ])
+    else:
+        from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+        
+        session_manager = StreamableHTTPSessionManager(app=app)
+        
+        async def handle_mcp(scope, receive, send):
+            await session_manager.handle_request(scope, receive, send)
+        
+        http_app = Starlette(
+            routes=[Mount("/mcp", app=handle_mcp)],
+            lifespan=lambda _: session_manager.run(),
         )
+    
+    # Default port matches the backend client's MCP_SERVER_URL default
+    host = os.getenv("MCP_SERVER_HOST", "127.0.0.1")
+    port = int(os.getenv("MCP_SERVER_PORT", "8765"))
+    logger.info(f"MCP AI Server ready on {transport} at http://{host}:{port}")
+    await uvicorn.Server(uvicorn.Config(http_app, host=host, port=port, log_level="warning")).serve()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())